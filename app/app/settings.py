@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'drf_spectacular',
     'rest_framework.authtoken',
@@ -50,6 +51,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,10 +60,13 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'app.urls'
 
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -83,17 +89,92 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# core.db is the PostgreSQL backend plus health checks and pooling, see
+# core/db/base.py. Either keep connections per thread with DB_CONN_MAX_AGE,
+# or set DB_POOL_SIZE (with DB_CONN_MAX_AGE=0) to share a bounded pool
+# between the threads of each uwsgi worker.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db',
         'NAME': os.environ.get("DB_NAME"),
         'HOST': os.environ.get("DB_HOST"),
         'USER': os.environ.get("DB_USER"),
         'PASSWORD': os.environ.get("DB_PASSWORD"),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'HEALTH_CHECKS': os.environ.get('DB_HEALTH_CHECKS', '1') == '1',
+        'POOL': {
+            'MAX_SIZE': int(os.environ.get('DB_POOL_SIZE', 0)),
+            'MAX_IDLE': int(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            'TIMEOUT': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# locmem is per process: with several uwsgi workers set CACHE_BACKEND to a
+# shared backend (e.g. memcached) so invalidations reach every worker
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds a per user recipe/tag/ingredient response stays cached
+RECIPE_API_CACHE_TIMEOUT = int(os.environ.get('RECIPE_API_CACHE_TIMEOUT', 300))
+
+# Tag/ingredient autocomplete results cached in each process
+AUTOCOMPLETE_CACHE_SIZE = int(os.environ.get('AUTOCOMPLETE_CACHE_SIZE', 2048))
+
+# Seconds an API token to user resolution stays cached
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.environ.get('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+
+# Cache token resolutions in a process local cache too. Only safe with a
+# single process, invalidations do not reach other workers
+AUTH_TOKEN_CACHE_LOCAL = os.environ.get('AUTH_TOKEN_CACHE_LOCAL', '0') == '1'
+
+# Recipes read per server side cursor fetch by the recipe export
+RECIPE_EXPORT_CHUNK_SIZE = 500
+
+# Share of requests timed by ServerTimingMiddleware, from 0 to 1
+SERVER_TIMING_SAMPLE_RATE = float(
+    os.environ.get('SERVER_TIMING_SAMPLE_RATE', 0.1))
+
+# Bearer token required to read /metrics. Without one /metrics is only
+# served with DEBUG on
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Where ProfilingMiddleware keeps profiles of staff requests, newest
+# PROFILE_MAX_COUNT only
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '/vol/profiles')
+PROFILE_MAX_COUNT = int(os.environ.get('PROFILE_MAX_COUNT', 100))
+
+# Request timing lines of ServerTimingMiddleware go to stderr, which
+# uwsgi and docker collect. Set SERVER_TIMING_LOG_LEVEL=WARNING to mute.
+# Tests run with sampling and these lines off, see core.test_runner
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': os.environ.get('SERVER_TIMING_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -137,6 +218,26 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = '/vol/web/static'
 STATIC_ROOT = '/vol/web/media'
 
+# Uploads stream to a temporary file and are aborted past UPLOAD_MAX_BYTES,
+# keep it in line with client_max_body_size in proxy/default.conf.tpl.
+# Images are checked against the caps below from their header only.
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.MaxSizeUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 10 * 1024 * 1024))
+UPLOAD_MAX_PIXELS = int(os.environ.get('UPLOAD_MAX_PIXELS', 40_000_000))
+UPLOAD_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+# Uploaded recipe images are resized and re-encoded after the request in
+# a pool of this many threads per process, 0 processes them inline
+IMAGE_PROCESSING_WORKERS = int(os.environ.get('IMAGE_PROCESSING_WORKERS', 2))
+# 'uuid' stores every upload under a new name, 'content' stores each
+# distinct image once by SHA-256 (see recipe/images.py and sweep_images)
+IMAGE_STORAGE_MODE = os.environ.get('IMAGE_STORAGE_MODE', 'uuid')
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_QUALITY = 80
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -145,7 +246,17 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema'
+    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson backed, falling back to DRF's JSON classes without orjson
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 # enable ablity to upload file through swagger
@@ -22,7 +22,19 @@ from drf_spectacular.views import (
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import metrics_view, profile_detail, profile_list
+
 urlpatterns = [
+    path(
+        'admin/profiles/',
+        admin.site.admin_view(profile_list),
+        name='profile-list'
+    ),
+    path(
+        'admin/profiles/<str:profile_id>/',
+        admin.site.admin_view(profile_detail),
+        name='profile-detail'
+    ),
     path('admin/', admin.site.urls),
     path('api/schema/', SpectacularAPIView.as_view(), name='api-schema'),
     path(
@@ -31,7 +43,8 @@ urlpatterns = [
         name='api-docs'
     ),
     path('api/user/', include('user.urls')),
-    path('api/recipe/', include('recipe.urls'))
+    path('api/recipe/', include('recipe.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 
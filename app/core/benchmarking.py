@@ -0,0 +1,50 @@
+"""
+Helpers shared by the benchmark management commands
+"""
+import resource
+from decimal import Decimal
+
+from core.models import Recipe, Tag, Ingredient
+
+
+def create_benchmark_recipes(user, count):
+    """Create count recipes with a few tags and ingredients each"""
+    tags = Tag.objects.bulk_create(
+        [Tag(user=user, name=f'Tag {i}') for i in range(20)])
+    ingredients = Ingredient.objects.bulk_create([
+        Ingredient(user=user, name=f'Ingredient {i}') for i in range(50)
+    ])
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            user=user,
+            title=f'Recipe {i}',
+            description='A recipe with a description of some length',
+            time_minutes=i % 120,
+            price=Decimal(i % 100) + Decimal('0.99'),
+            link='https://example.com/recipe'
+        )
+        for i in range(count)
+    ])
+    for model, items, per_recipe in (
+            (Tag, tags, 3), (Ingredient, ingredients, 8)):
+        model.objects.add_links([
+            (recipe.id, items[(i + j) % len(items)].id)
+            for i, recipe in enumerate(recipes)
+            for j in range(per_recipe)
+        ])
+
+
+def rss_mb():
+    """Return current resident memory of this process in MB"""
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except OSError:
+        # No procfs, fall back to the peak, in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return pages * resource.getpagesize() / 1024 / 1024
+
+
+def zipf_weights(count):
+    """Return weights making the first items the most popular"""
+    return [1 / rank for rank in range(1, count + 1)]
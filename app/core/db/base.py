@@ -0,0 +1,93 @@
+"""
+PostgreSQL backend with connection health checks and optional pooling
+
+Extra DATABASES keys:
+    HEALTH_CHECKS: check a reused connection with SELECT 1 before the
+        first query of each request and reconnect if it is broken.
+    POOL: {'MAX_SIZE': n, 'MAX_IDLE': seconds, 'TIMEOUT': seconds}
+        shares up to n connections between the threads of a process.
+        A MAX_SIZE of 0 disables pooling. Use with CONN_MAX_AGE = 0 so
+        connections go back to the pool at the end of each request.
+"""
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.settings_dict.setdefault('HEALTH_CHECKS', False)
+        self.settings_dict.setdefault('POOL', {})
+        self.health_check_done = False
+
+    @property
+    def pool(self):
+        """Return the connection pool of this database, if enabled"""
+        options = self.settings_dict['POOL']
+        if not options.get('MAX_SIZE'):
+            return None
+        return get_pool(
+            f"{self.alias}:{self.settings_dict['NAME']}",
+            max_size=options['MAX_SIZE'],
+            max_idle=options.get('MAX_IDLE', 300),
+            timeout=options.get('TIMEOUT', 10),
+            check=self._connection_usable if self.settings_dict[
+                'HEALTH_CHECKS'] else None,
+        )
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            connection = super().get_new_connection(conn_params)
+        else:
+            connection = pool.checkout(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params))
+            self.isolation_level = self.settings_dict['OPTIONS'].get(
+                'isolation_level', connection.isolation_level)
+        # A fresh or pool checked connection needs no check this request
+        self.health_check_done = True
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        connection = self.connection
+        discard = self.errors_occurred
+        try:
+            if connection.info.transaction_status != (
+                    extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except Exception:
+            discard = True
+        pool.checkin(connection, discard=discard)
+
+    def close_if_unusable_or_obsolete(self):
+        # Called when a request starts and finishes
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (self.connection is not None and
+                self.settings_dict['HEALTH_CHECKS'] and
+                not self.health_check_done and
+                not self.in_atomic_block):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
+
+    @staticmethod
+    def _connection_usable(connection):
+        """Return whether a raw connection answers a trivial query"""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        except base.Database.Error:
+            return False
+        return True
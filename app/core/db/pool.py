@@ -0,0 +1,161 @@
+"""
+Per process database connection pool
+"""
+import collections
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    """No connection became available before the checkout timeout"""
+
+
+class ConnectionPool:
+    """ Bounded pool of DB-API connections shared by a process' threads
+
+    Idle connections older than max_idle seconds are closed on the next
+    checkout. Idle connections are health checked before being handed
+    out, and replaced when the check fails.
+    """
+
+    def __init__(self, max_size, max_idle=300, timeout=10, check=None):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.check = check
+        self._idle = collections.deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._stats = collections.Counter()
+
+    def checkout(self, connect):
+        """Return an idle connection, or one made with connect()
+
+        The lock is only held to take a connection or a slot, health
+        checks, connects and closes run outside it so a slow or dead
+        socket does not block other threads.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            self._stats['checkouts'] += 1
+        waited = False
+        while True:
+            conn = None
+            with self._cond:
+                expired = self._pop_expired()
+                if self._idle:
+                    # The connection keeps its slot while it is checked
+                    conn = self._idle.pop()[0]
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    # Nothing expired, expiring frees a slot
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No connection available within {self.timeout}s')
+                    if not waited:
+                        waited = True
+                        self._stats['waits'] += 1
+                    self._cond.wait(remaining)
+                    continue
+            self._close(expired)
+
+            if conn is None:
+                break
+            if self.check is None or self.check(conn):
+                return conn
+            self._close([conn])
+            with self._cond:
+                self._stats['reconnects'] += 1
+                self._release(1)
+
+        try:
+            conn = connect()
+        except Exception:
+            with self._cond:
+                self._release(1)
+            raise
+
+        with self._cond:
+            self._stats['connects'] += 1
+        return conn
+
+    def checkin(self, conn, discard=False):
+        """Return a connection to the pool, closing it if discard"""
+        if discard or conn.closed:
+            self._close([conn])
+            with self._cond:
+                self._release(1)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._cond:
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._release(len(idle))
+        self._close(idle)
+
+    def stats(self):
+        """Return pool counters and current sizes"""
+        with self._cond:
+            return {
+                'checkouts': self._stats['checkouts'],
+                'waits': self._stats['waits'],
+                'timeouts': self._stats['timeouts'],
+                'connects': self._stats['connects'],
+                'reconnects': self._stats['reconnects'],
+                'evictions': self._stats['evictions'],
+                'size': self._size,
+                'idle': len(self._idle),
+            }
+
+    def _pop_expired(self):
+        """Take idle connections unused for more than max_idle seconds
+        and release their slots, the caller closes them without the lock"""
+        expired = []
+        cutoff = time.monotonic() - self.max_idle
+        # Oldest connections are on the left, checkouts pop from the right
+        while self._idle and self._idle[0][1] < cutoff:
+            expired.append(self._idle.popleft()[0])
+        self._stats['evictions'] += len(expired)
+        self._release(len(expired))
+        return expired
+
+    def _release(self, count):
+        """Free the slots of closed connections, with the lock held"""
+        if count:
+            self._size -= count
+            self._cond.notify(count)
+
+    def _close(self, conns):
+        """Close connections, ignoring errors of broken ones"""
+        for conn in conns:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, **options):
+    """Return the process wide pool for key, creating it on first use"""
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(**options)
+        return _pools[key]
+
+
+def pool_stats():
+    """Return stats of every pool of this process"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {key: pool.stats() for key, pool in pools.items()}
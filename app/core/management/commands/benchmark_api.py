@@ -0,0 +1,338 @@
+"""
+Django command to load test the API routes on seeded data
+
+"""
+import datetime
+import io
+import itertools
+import json
+import math
+import platform
+import random
+import resource
+import subprocess
+import threading
+import time
+from decimal import Decimal
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from core.benchmarking import rss_mb, zipf_weights
+from core.models import Recipe, Tag, Ingredient
+from recipe.images import wait_for_image_processing
+
+SCENARIOS = [
+    'token', 'me', 'recipe-list', 'recipe-detail', 'autocomplete',
+    'upload-image'
+]
+
+EMAIL_PREFIX = 'benchmark-api-'
+PASSWORD = 'benchmark'
+
+TITLE_WORDS = [
+    'Spicy', 'Creamy', 'Roasted', 'Quick', 'Vegan', 'Lemon', 'Garlic',
+    'Smoky', 'Curry', 'Soup', 'Salad', 'Stew', 'Pasta', 'Tacos', 'Bowl',
+]
+
+
+def percentile(values, percent):
+    """Return the nearest rank percentile of sorted values"""
+    if not values:
+        return None
+    rank = math.ceil(percent / 100 * len(values))
+    return values[max(rank, 1) - 1]
+
+
+class Command(BaseCommand):
+    """Seed synthetic users and recipes, then load test the API routes
+
+    Every scenario sends --requests requests through the full middleware
+    and URL stack from --concurrency threads, each with its own database
+    connection. Tags and ingredients are picked with a Zipf distribution,
+    so a few are on most recipes, and --seed makes the data and the
+    request sequence reproducible.
+
+    The seeded users are committed, since the threads do not share a
+    transaction, and deleted at the end unless --keep is given.
+    """
+
+    help = 'Benchmark throughput and latency of the API routes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument(
+            '--recipes', type=int, default=200, help='Recipes per user')
+        parser.add_argument(
+            '--tags', type=int, default=30, help='Tags per user')
+        parser.add_argument(
+            '--ingredients', type=int, default=100,
+            help='Ingredients per user')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write results as JSON here')
+        parser.add_argument(
+            '--keep', action='store_true',
+            help='Keep the seeded data instead of deleting it')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['recipes'],
+               options['requests'], options['concurrency']) < 1:
+            raise CommandError(
+                'users, recipes, requests and concurrency must be positive')
+
+        rng = random.Random(options['seed'])
+        self._delete_users()
+        start = time.perf_counter()
+        users = self._seed(rng, options)
+        seed_seconds = time.perf_counter() - start
+        self.stdout.write(
+            f"Seeded {options['users']} users with {options['recipes']} "
+            f'recipes each in {seed_seconds:.1f} s')
+
+        self.image = self._build_image()
+        results = {}
+        # The test client sends requests to the 'testserver' host
+        hosts = override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'])
+        try:
+            with hosts:
+                for name in options['scenarios']:
+                    results[name] = self._run(name, users, options)
+                    self._write_result(name, results[name])
+            if 'upload-image' in options['scenarios']:
+                wait_for_image_processing()
+        finally:
+            if not options['keep']:
+                self._delete_users()
+
+        if options['output']:
+            report = {
+                'meta': self._meta(options, seed_seconds),
+                'scenarios': results,
+            }
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def _seed(self, rng, options):
+        """ Create the users, their tokens, tags, ingredients and recipes """
+        users = []
+        for i in range(options['users']):
+            user = get_user_model().objects.create_user(
+                email=f'{EMAIL_PREFIX}{i}@example.com',
+                password=PASSWORD,
+                name=f'Benchmark {i}'
+            )
+            tags = Tag.objects.bulk_create([
+                Tag(user=user, name=f'Tag {j}')
+                for j in range(options['tags'])
+            ])
+            ingredients = Ingredient.objects.bulk_create([
+                Ingredient(user=user, name=f'Ingredient {j}')
+                for j in range(options['ingredients'])
+            ])
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    user=user,
+                    title=' '.join(rng.sample(TITLE_WORDS, 3)),
+                    description=' '.join(rng.choices(TITLE_WORDS, k=20)),
+                    time_minutes=rng.randint(5, 180),
+                    price=Decimal(rng.randint(100, 5000)) / 100,
+                    link=f'https://example.com/recipes/{i}/{j}'
+                )
+                for j in range(options['recipes'])
+            ])
+            self._link(rng, recipes, Tag, tags, (0, 4))
+            self._link(rng, recipes, Ingredient, ingredients, (3, 12))
+            users.append({
+                'email': user.email,
+                'token': Token.objects.create(user=user).key,
+                'recipe_ids': [recipe.id for recipe in recipes],
+            })
+        return users
+
+    def _link(self, rng, recipes, model, items, count_range):
+        """ Link each recipe to a random number of Zipf distributed items """
+        if not items:
+            return
+        weights = zipf_weights(len(items))
+        model.objects.add_links([
+            (recipe.id, item.id)
+            for recipe in recipes
+            for item in set(rng.choices(
+                items, weights, k=rng.randint(*count_range)))
+        ])
+
+    def _delete_users(self):
+        """ Delete the seeded users, cascading to everything they own """
+        get_user_model().objects.filter(
+            email__startswith=EMAIL_PREFIX,
+            email__endswith='@example.com'
+        ).delete()
+
+    def _build_image(self):
+        """ Return the bytes of a small JPEG to upload """
+        image = Image.linear_gradient('L').convert('RGB').resize((800, 600))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG')
+        return buffer.getvalue()
+
+    def _request(self, name, user, i):
+        """ Return the client method, url and kwargs of request i """
+        auth = {'HTTP_AUTHORIZATION': f"Token {user['token']}"}
+        recipe_id = user['recipe_ids'][i * 7919 % len(user['recipe_ids'])]
+
+        if name == 'token':
+            return 'post', reverse('user:token'), {
+                'data': {'email': user['email'], 'password': PASSWORD}}
+        if name == 'me':
+            return 'get', reverse('user:me'), auth
+        if name == 'recipe-list':
+            return 'get', reverse('recipe:recipe-list'), {
+                'data': {'page_size': 50}, **auth}
+        if name == 'recipe-detail':
+            return 'get', reverse(
+                'recipe:recipe-detail', args=[recipe_id]), auth
+        if name == 'autocomplete':
+            # 100 distinct prefixes, later requests repeat them
+            return 'get', reverse('recipe:ingredient-autocomplete'), {
+                'data': {'q': f'Ingredient {i * 7919 % 100}'}, **auth}
+
+        upload = io.BytesIO(self.image)
+        upload.name = 'benchmark.jpg'
+        return 'post', reverse(
+            'recipe:recipe-upload-image', args=[recipe_id]), {
+                'data': {'image': upload}, **auth}
+
+    def _run(self, name, users, options):
+        """ Send the requests of a scenario and return its statistics """
+        requests = options['requests']
+        concurrency = min(options['concurrency'], requests)
+        counter = itertools.count()
+        latencies = []
+        queries = []
+        errors = []
+
+        def send():
+            client = Client(raise_request_exception=False)
+            try:
+                while True:
+                    i = next(counter)
+                    if i >= requests:
+                        break
+                    method, url, kwargs = self._request(
+                        name, users[i % len(users)], i)
+                    with CaptureQueriesContext(connection) as ctx:
+                        start = time.perf_counter()
+                        response = getattr(client, method)(url, **kwargs)
+                        latencies.append(time.perf_counter() - start)
+                    queries.append(len(ctx.captured_queries))
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+            finally:
+                if concurrency > 1:
+                    connections.close_all()
+
+        baseline = rss_mb()
+        peak = [baseline]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.005):
+                peak[0] = max(peak[0], rss_mb())
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        start = time.perf_counter()
+        if concurrency == 1:
+            # Inline, so a caller's transaction and connection are used
+            send()
+        else:
+            threads = [
+                threading.Thread(target=send) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'concurrency': concurrency,
+            'errors': len(errors),
+            'status_codes': sorted(set(errors)),
+            'seconds': elapsed,
+            'throughput_rps': len(latencies) / elapsed,
+            'latency_ms': {
+                key: value * 1000 for key, value in (
+                    ('mean', sum(latencies) / len(latencies)),
+                    ('p50', percentile(latencies, 50)),
+                    ('p95', percentile(latencies, 95)),
+                    ('p99', percentile(latencies, 99)),
+                    ('max', latencies[-1]))
+            },
+            'queries_per_request': {
+                'mean': sum(queries) / len(queries),
+                'max': max(queries),
+            },
+            'rss_mb': {'baseline': baseline, 'peak': peak[0]},
+        }
+
+    def _write_result(self, name, result):
+        """ Write a one line summary of a scenario """
+        latency = result['latency_ms']
+        self.stdout.write(
+            f"{name:>14}: {result['throughput_rps']:.1f} req/s, "
+            f"p50 {latency['p50']:.1f} ms, p95 {latency['p95']:.1f} ms, "
+            f"p99 {latency['p99']:.1f} ms, "
+            f"{result['queries_per_request']['mean']:.1f} queries/request, "
+            f"peak RSS {result['rss_mb']['peak']:.1f} MB, "
+            f"{result['errors']} errors"
+        )
+
+    def _meta(self, options, seed_seconds):
+        """ Return what identifies a run, to compare results across runs """
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+
+        return {
+            'commit': commit,
+            'finished_at': datetime.datetime.now(
+                datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'options': {
+                key: options[key] for key in (
+                    'users', 'recipes', 'tags', 'ingredients', 'requests',
+                    'concurrency', 'scenarios', 'seed')
+            },
+            'seed_seconds': seed_seconds,
+            'max_rss_mb':
+                resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
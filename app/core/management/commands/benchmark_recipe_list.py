@@ -0,0 +1,84 @@
+"""
+Django command to benchmark serializing recipe lists
+
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmarking import create_benchmark_recipes
+from core.models import Recipe, Tag, Ingredient
+from core.renderers import FastJSONRenderer
+from recipe.serializers import RecipeSerializer, RecipeRowsSerializer
+
+
+class Command(BaseCommand):
+    """Compare RecipeSerializer and RecipeRowsSerializer on recipe lists
+
+    Each run reads, serializes and renders the list, like the list
+    action. Recipes are created inside a transaction that is rolled back,
+    so the command leaves no rows behind.
+    """
+
+    help = 'Benchmark throughput of recipe list serializers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--runs', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark-list@example.com',
+                password='benchmark'
+            )
+            create_benchmark_recipes(user, max(options['sizes']))
+            recipes = Recipe.objects.filter(user=user).defer(
+                'search_vector').order_by('-id')
+
+            for size in options['sizes']:
+                self.stdout.write(f'{size} recipes:')
+                for name, serialize in (
+                        ('serializer', self._serializer),
+                        ('rows', self._rows)):
+                    queries, elapsed = self._measure(
+                        serialize, recipes[:size], options['runs'])
+                    self.stdout.write(
+                        f'{name:>12}: {queries} queries, '
+                        f'{elapsed * 1000:.1f} ms, '
+                        f'{size / elapsed:.0f} recipes/s'
+                    )
+            transaction.set_rollback(True)
+
+    def _serializer(self, queryset):
+        """ Return RecipeSerializer data, prefetched like the views """
+        return RecipeSerializer(
+            queryset.prefetch_related(
+                Prefetch('tags', queryset=Tag.objects.order_by('id')),
+                Prefetch(
+                    'ingredients', queryset=Ingredient.objects.order_by('id'))
+            ),
+            many=True
+        ).data
+
+    def _rows(self, queryset):
+        """ Return RecipeRowsSerializer data """
+        return RecipeRowsSerializer(
+            RecipeRowsSerializer.values(queryset)).data
+
+    def _measure(self, serialize, queryset, runs):
+        """ Return queries and best seconds to serialize and render """
+        renderer = FastJSONRenderer()
+        best = None
+        for _ in range(runs):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                renderer.render(serialize(queryset))
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return len(ctx.captured_queries), best
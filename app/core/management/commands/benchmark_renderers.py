@@ -0,0 +1,66 @@
+"""
+Django command to benchmark JSON rendering of recipe list payloads
+
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.benchmarking import create_benchmark_recipes
+from core.models import Recipe
+from core.renderers import FastJSONRenderer
+from recipe.serializers import RecipeSerializer
+
+
+class Command(BaseCommand):
+    """Compare JSONRenderer and FastJSONRenderer on RecipeSerializer data
+
+    Recipes are created inside a transaction that is rolled back, so the
+    command leaves no rows behind. Only rendering is timed, serializing
+    is reported once for comparison.
+    """
+
+    help = 'Benchmark render time of recipe list payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[1000, 10000])
+        parser.add_argument('--runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark-render@example.com',
+                password='benchmark'
+            )
+            create_benchmark_recipes(user, max(options['sizes']))
+
+            for size in options['sizes']:
+                recipes = Recipe.objects.filter(user=user).order_by(
+                    '-id').prefetch_related('tags', 'ingredients')[:size]
+                start = time.perf_counter()
+                data = RecipeSerializer(recipes, many=True).data
+                serialize = time.perf_counter() - start
+                self.stdout.write(
+                    f'{size} recipes: serialize {serialize * 1000:.1f} ms')
+
+                for name, renderer in (
+                        ('json', JSONRenderer()),
+                        ('fast', FastJSONRenderer())):
+                    elapsed = self._measure(renderer, data, options['runs'])
+                    self.stdout.write(
+                        f'{name:>10}: render {elapsed * 1000:.2f} ms')
+            transaction.set_rollback(True)
+
+    def _measure(self, renderer, data, runs):
+        """ Return the best seconds out of runs to render data """
+        best = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            renderer.render(data)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,70 @@
+"""
+Django command to benchmark per request token authentication
+
+"""
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+
+from user.authentication import (
+    CachedTokenAuthentication,
+    invalidate_token
+)
+
+
+class Command(BaseCommand):
+    """Compare TokenAuthentication and CachedTokenAuthentication
+
+    Everything runs inside a transaction that is rolled back, so the
+    command leaves no rows behind.
+    """
+
+    help = 'Benchmark per request cost of token authentication'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    @override_settings(AUTH_TOKEN_CACHE_LOCAL=True)
+    def handle(self, *args, **options):
+        # One process, so a local cache is as good as a shared one here
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                email='benchmark-auth@example.com',
+                password='benchmark'
+            )
+            token = Token.objects.create(user=user)
+            request = RequestFactory().get(
+                '/', HTTP_AUTHORIZATION=f'Token {token.key}')
+
+            for name, authentication in (
+                    ('token', TokenAuthentication()),
+                    ('cached', CachedTokenAuthentication())):
+                queries, elapsed = self._measure(
+                    authentication, request, options['requests'])
+                self.stdout.write(
+                    f'{name:>8}: {queries:.2f} queries, '
+                    f'{elapsed * 1000000:.1f} us per request'
+                )
+            invalidate_token(token.key)
+            transaction.set_rollback(True)
+
+    def _measure(self, authentication, request, requests):
+        """ Return queries and seconds per authenticated request """
+        start = time.perf_counter()
+        for _ in range(requests):
+            authentication.authenticate(Request(request))
+        elapsed = time.perf_counter() - start
+
+        # Count separately, capturing queries slows the database path down
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(requests):
+                authentication.authenticate(Request(request))
+
+        return len(ctx.captured_queries) / requests, elapsed / requests
@@ -0,0 +1,145 @@
+"""
+Django command to benchmark peak memory of concurrent image uploads
+
+"""
+import io
+import math
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django import forms
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand
+from django.core.files.uploadhandler import load_handler
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+
+from core.benchmarking import rss_mb
+from core.uploads import HeaderImageField
+
+MODES = {
+    # Django's default handlers and ImageField, as before core.uploads
+    'default': (
+        [
+            'django.core.files.uploadhandler.MemoryFileUploadHandler',
+            'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+        ],
+        forms.ImageField,
+    ),
+    'streaming': (settings.FILE_UPLOAD_HANDLERS, HeaderImageField),
+}
+
+
+class Command(BaseCommand):
+    """Parse and validate concurrent multipart image uploads
+
+    Resident memory is sampled while the uploads run and reported over
+    the baseline after building the request body. Without --mode every
+    mode runs in its own subprocess so they do not share freed memory.
+    Requests are parsed and validated in threads, like uwsgi with
+    --enable-threads, without touching the database.
+    """
+
+    help = 'Benchmark peak RSS of concurrent image uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=sorted(MODES))
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--size-mb', type=float, default=10)
+
+    def handle(self, *args, **options):
+        if options['mode'] is None:
+            for mode in MODES:
+                self.stdout.write(self._run_subprocess(mode, options))
+            return
+
+        body = self._build_body(options['size_mb'])
+        baseline = rss_mb()
+        peak = [baseline]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.001):
+                peak[0] = max(peak[0], rss_mb())
+
+        sampler = threading.Thread(target=sample)
+        sampler.start()
+        start = time.perf_counter()
+        errors = self._run_uploads(
+            body, options['concurrency'], *MODES[options['mode']])
+        elapsed = time.perf_counter() - start
+        done.set()
+        sampler.join()
+
+        self.stdout.write(
+            f"{options['mode']:>10}: {options['concurrency']} x "
+            f'{len(body) / 1024 / 1024:.1f} MB uploads, '
+            f'peak RSS +{peak[0] - baseline:.1f} MB over {baseline:.1f} MB, '
+            f'{elapsed * 1000:.0f} ms, {errors} rejected'
+        )
+
+    def _run_subprocess(self, mode, options):
+        """ Run a single mode in a fresh process and return its output """
+        result = subprocess.run(
+            [
+                sys.executable, str(settings.BASE_DIR / 'manage.py'),
+                'benchmark_uploads', '--mode', mode,
+                '--concurrency', str(options['concurrency']),
+                '--size-mb', str(options['size_mb']),
+            ],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+        return result.stdout.strip()
+
+    def _build_body(self, size_mb):
+        """ Return a multipart body holding a PNG of about size_mb """
+        # Noise does not compress, so the PNG is about 3 bytes a pixel
+        side = int(math.sqrt(size_mb * 1024 * 1024 * 0.95 / 3))
+        image = Image.frombytes(
+            'RGB', (side, side), os.urandom(side * side * 3))
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG', compress_level=0)
+        buffer.name = 'upload.png'
+        buffer.seek(0)
+        return encode_multipart(BOUNDARY, {'image': buffer})
+
+    def _run_uploads(self, body, concurrency, handlers, field_class):
+        """ Parse and validate body in concurrent threads """
+        barrier = threading.Barrier(concurrency)
+        errors = []
+
+        def upload():
+            request = WSGIRequest({
+                'REQUEST_METHOD': 'POST',
+                'PATH_INFO': '/',
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'wsgi.url_scheme': 'http',
+                # Shares the buffer of body, no copy per request
+                'wsgi.input': io.BytesIO(body),
+                'CONTENT_TYPE': MULTIPART_CONTENT,
+                'CONTENT_LENGTH': str(len(body)),
+            })
+            request.upload_handlers = [
+                load_handler(handler, request) for handler in handlers]
+            barrier.wait()
+            try:
+                upload = request.FILES['image']
+                field_class().clean(upload)
+                upload.close()
+            except Exception:
+                errors.append(1)
+
+        threads = [
+            threading.Thread(target=upload) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(errors)
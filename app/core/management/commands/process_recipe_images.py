@@ -0,0 +1,32 @@
+"""
+Django command to build variants of recipe images not processed yet
+
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe.images import process_recipe_image
+
+
+class Command(BaseCommand):
+    """Process pending (and optionally failed) recipe images inline"""
+
+    help = 'Build resized variants of unprocessed recipe images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Also process images that failed before')
+
+    def handle(self, *args, **options):
+        statuses = [Recipe.IMAGE_PENDING]
+        if options['retry_failed']:
+            statuses.append(Recipe.IMAGE_FAILED)
+
+        recipe_ids = list(Recipe.objects.filter(
+            image_status__in=statuses).values_list('id', flat=True))
+        for recipe_id in recipe_ids:
+            process_recipe_image(recipe_id)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(recipe_ids)} recipe images'))
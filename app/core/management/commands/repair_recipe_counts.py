@@ -0,0 +1,36 @@
+"""
+Django command to recount recipe_count of tags and ingredients
+
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Tag, Ingredient
+
+
+class Command(BaseCommand):
+    """Recount recipe_count of every tag and ingredient from its links
+
+    Counts drift when links change outside RecipeAttrManager and the
+    recipe signals, like raw SQL or queryset updates. Objects are
+    recounted in id ranges of --batch-size, so each statement stays short.
+    """
+
+    help = 'Recount recipe_count of tags and ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model in (Tag, Ingredient):
+            ids = model.objects.order_by('id').values_list('id', flat=True)
+            first, last = ids.first(), ids.last()
+            fixed = 0
+            if first is not None:
+                for start in range(first, last + 1, batch_size):
+                    fixed += model.objects.repair_counts(
+                        id__gte=start, id__lt=start + batch_size)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'Fixed recipe_count of {fixed} '
+                f'{model._meta.verbose_name_plural}'))
@@ -0,0 +1,34 @@
+"""
+Django command to delete stored images no recipe references
+
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import StoredImage
+from recipe.images import sweep_image
+
+
+class Command(BaseCommand):
+    """Delete unreferenced content addressed images and their variants
+
+    Images released less than --min-age-hours ago are kept, so an upload
+    of the same content in the meantime can still reuse them.
+    """
+
+    help = 'Delete stored recipe images with no references'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age-hours', type=float, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['min_age_hours'])
+        candidates = list(StoredImage.objects.filter(
+            ref_count=0, released_at__lt=cutoff).values_list('id', flat=True))
+
+        deleted = sum(sweep_image(stored_id) for stored_id in candidates)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} unreferenced images'))
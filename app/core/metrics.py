@@ -0,0 +1,106 @@
+"""
+Prometheus metrics of the API
+
+With PROMETHEUS_MULTIPROC_DIR set, as scripts/run.sh does for the uwsgi
+workers, every process writes its samples to memory mapped files in that
+directory and the /metrics view aggregates the files of all workers.
+The directory has to be emptied before the workers start.
+"""
+import atexit
+import os
+import threading
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess
+)
+
+from core.db.pool import pool_stats
+
+REQUESTS = Counter(
+    'http_requests_total',
+    'Requests by endpoint, method and status code',
+    ['endpoint', 'method', 'status']
+)
+LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'Time to produce the response by endpoint and method',
+    ['endpoint', 'method'],
+    buckets=(
+        .005, .01, .025, .05, .075, .1, .25, .5, .75, 1, 2.5, 5, 10)
+)
+DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'SQL queries per request by endpoint',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100)
+)
+CACHE_REQUESTS = Counter(
+    'recipe_api_cache_requests_total',
+    'Lookups of the per user response cache, by hits and misses',
+    ['result']
+)
+POOL_CONNECTIONS = Gauge(
+    'db_pool_connections',
+    'Open pooled database connections by state',
+    ['pool', 'state'],
+    multiprocess_mode='livesum'
+)
+POOL_EVENTS = Gauge(
+    'db_pool_events',
+    'Database pool events since the worker started',
+    ['pool', 'event'],
+    multiprocess_mode='livesum'
+)
+
+# Seconds between two updates of the pool gauges of a process
+POOL_UPDATE_INTERVAL = 5
+
+_pool_updated = 0
+_pool_lock = threading.Lock()
+
+
+def update_pool_metrics():
+    """Copy the stats of the connection pools to their gauges
+
+    Runs at most once per POOL_UPDATE_INTERVAL, so it can be called on
+    every request.
+    """
+    global _pool_updated
+    now = time.monotonic()
+    with _pool_lock:
+        if now - _pool_updated < POOL_UPDATE_INTERVAL:
+            return
+        _pool_updated = now
+
+    for pool, stats in pool_stats().items():
+        for state in ('size', 'idle'):
+            POOL_CONNECTIONS.labels(pool, state).set(stats.pop(state))
+        for event, count in stats.items():
+            POOL_EVENTS.labels(pool, event).set(count)
+
+
+def render_metrics():
+    """Return the metrics of every process and their content type"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _mark_process_dead():
+    """Drop the live gauges of this process from the aggregates"""
+    multiprocess.mark_process_dead(os.getpid())
+
+
+if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+    atexit.register(_mark_process_dead)
@@ -0,0 +1,232 @@
+"""
+Middleware reporting where the time of a request went
+"""
+import cProfile
+import contextlib
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from core import metrics
+from core.profiling import save_profile
+from core.timing import RequestTiming, activate, current_timing, deactivate
+
+logger = logging.getLogger(__name__)
+
+# Phases in the order they are reported
+PHASES = ['db', 'view', 'serialize', 'render', 'total']
+
+
+class ServerTimingMiddleware:
+    """Report SQL, view, serialize and render time of sampled requests
+
+    A SERVER_TIMING_SAMPLE_RATE share of requests is timed, others only
+    pay for one random() call. Timed responses get a Server-Timing header
+    and a log line on the core.middleware logger, with key=value fields
+    and the same fields as the server_timing attribute of the record.
+
+    The view phase runs from process_view until the view returns, render
+    from there until the response is rendered, serialize covers the .data
+    of timed serializers (see core.timing) and db every SQL query on any
+    connection of the request thread. Put the middleware first so total
+    includes the other middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.SERVER_TIMING_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = activate(timing)
+        start = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(timing.execute))
+                response = self.get_response(request)
+        finally:
+            deactivate(token)
+        # Views returning plain responses are not rendered
+        timing.stop_all()
+        timing.durations['total'] = time.perf_counter() - start
+
+        response['Server-Timing'] = self._header(timing)
+        self._log(request, response, timing)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = current_timing()
+        if timing is not None:
+            timing.start('view')
+
+    def process_template_response(self, request, response):
+        timing = current_timing()
+        if timing is not None:
+            timing.stop('view')
+            timing.start('render')
+            response.add_post_render_callback(
+                lambda response: timing.stop('render'))
+        return response
+
+    def _header(self, timing):
+        """ Return the Server-Timing header value of timing """
+        metrics = []
+        for name in PHASES:
+            if name not in timing.durations:
+                continue
+            metric = f'{name};dur={timing.durations[name] * 1000:.1f}'
+            if name == 'db':
+                metric += f';desc="{timing.queries} queries"'
+            metrics.append(metric)
+        return ', '.join(metrics)
+
+    def _log(self, request, response, timing):
+        """ Log the timing of a request as one key=value line """
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timing.queries,
+        }
+        for name in PHASES:
+            fields[f'{name}_ms'] = round(
+                timing.durations.get(name, 0) * 1000, 1)
+        logger.info(
+            ' '.join(f'{key}={value}' for key, value in fields.items()),
+            extra={'server_timing': fields}
+        )
+
+
+class MetricsMiddleware:
+    """Record request count, latency and SQL queries per endpoint
+
+    Endpoints are named basename.action for viewsets, like recipe.list or
+    recipe.upload_image, and by URL name otherwise, like user.token.
+    Requests not matching any URL are counted as unmatched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        request.metrics_endpoint = 'unmatched'
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        endpoint = request.metrics_endpoint
+        metrics.REQUESTS.labels(
+            endpoint, request.method, response.status_code).inc()
+        metrics.LATENCY.labels(endpoint, request.method).observe(elapsed)
+        metrics.DB_QUERIES.labels(endpoint).observe(queries[0])
+        metrics.update_pool_metrics()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        actions = getattr(view_func, 'actions', None)
+        if actions:
+            method = request.method.lower()
+            request.metrics_endpoint = (
+                f"{view_func.initkwargs.get('basename')}."
+                f'{actions.get(method, method)}'
+            )
+        else:
+            request.metrics_endpoint = (
+                request.resolver_match.view_name.replace(':', '.'))
+
+
+class ProfilingMiddleware:
+    """Run flagged staff requests under cProfile
+
+    Requests sending an X-Profile header or a profile query parameter are
+    profiled if their user is staff, authenticated the way the view
+    would. The profiler is enabled in process_view and disabled once the
+    handler returns, so Django still wraps, runs and renders the view and
+    the exception and template response hooks run as usual. Profiles are
+    saved by core.profiling and their id returned in an X-Profile-Id
+    header. Other requests only pay for checking the flag.
+
+    One request per process is profiled at a time, since profilers of
+    concurrent threads may not be allowed. Put the middleware last, so
+    the profile holds as little middleware as possible.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            profiling = getattr(request, '_profiling', None)
+            if profiling is not None:
+                profiling[0].disable()
+                self.lock.release()
+        if profiling is None:
+            return response
+
+        profiler, start = profiling
+        elapsed = time.perf_counter() - start
+        response['X-Profile-Id'] = save_profile(profiler, {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'user': request.user.get_username(),
+            'duration_ms': round(elapsed * 1000, 1),
+            'created': timezone.now().isoformat(timespec='seconds'),
+        })
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if ('HTTP_X_PROFILE' not in request.META and
+                'profile' not in request.GET):
+            return None
+        if not self._is_staff(request, view_func):
+            return None
+        if not self.lock.acquire(blocking=False):
+            return None
+
+        profiler = cProfile.Profile()
+        request._profiling = (profiler, time.perf_counter())
+        profiler.enable()
+        return None
+
+    def _is_staff(self, request, view_func):
+        """ Return whether the user of the request is staff """
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is not None and issubclass(view_class, APIView):
+            # API users are only known once the view authenticates them
+            authenticators = [
+                authentication()
+                for authentication in view_class.authentication_classes
+            ]
+            try:
+                user = Request(request, authenticators=authenticators).user
+            except APIException:
+                return False
+        else:
+            user = request.user
+        return user.is_active and user.is_staff
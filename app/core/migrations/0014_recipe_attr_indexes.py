@@ -0,0 +1,147 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models, transaction
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """Merge tags/ingredients sharing a name for the same user
+
+    Recipe links of each duplicate are moved to the oldest row so the
+    (user, name) unique constraints can be built.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+
+    with transaction.atomic():
+        for field_name in ('tags', 'ingredients'):
+            field = Recipe._meta.get_field(field_name)
+            model = field.related_model
+            through = field.remote_field.through
+            attr_id = f'{model._meta.model_name}_id'
+
+            duplicates = (
+                model.objects.values('user_id', 'name')
+                .annotate(count=models.Count('id'), keep=models.Min('id'))
+                .filter(count__gt=1)
+            )
+            for duplicate in duplicates:
+                extra_ids = list(
+                    model.objects.filter(
+                        user_id=duplicate['user_id'],
+                        name=duplicate['name']
+                    ).exclude(id=duplicate['keep']).values_list(
+                        'id', flat=True)
+                )
+                links = through.objects.filter(**{f'{attr_id}__in': extra_ids})
+                through.objects.bulk_create(
+                    [
+                        through(
+                            recipe_id=recipe_id,
+                            **{attr_id: duplicate['keep']}
+                        )
+                        for recipe_id in links.values_list(
+                            'recipe_id', flat=True)
+                    ],
+                    ignore_conflicts=True
+                )
+                model.objects.filter(id__in=extra_ids).delete()
+
+
+def drop_invalid_index(cursor, name):
+    """Drop index name if a failed concurrent build left it INVALID
+
+    Such an index is never used, but IF NOT EXISTS would keep it and
+    ADD CONSTRAINT ... USING INDEX rejects it, so reruns would fail.
+    """
+    cursor.execute(
+        'SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)',
+        [name]
+    )
+    row = cursor.fetchone()
+    if row is not None and not row[0]:
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+def add_unique_concurrently(table, constraint):
+    """Build a unique index without locking writes, then attach it
+
+    Steps already done by an earlier, failed run are skipped.
+    """
+    def forwards(apps, schema_editor):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT 1 FROM pg_constraint '
+                'WHERE conname = %s AND conrelid = to_regclass(%s)',
+                [constraint, table]
+            )
+            if cursor.fetchone() is not None:
+                return
+            drop_invalid_index(cursor, constraint)
+            cursor.execute(
+                f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS '
+                f'"{constraint}" ON "{table}" ("user_id", "name")')
+            cursor.execute(
+                f'ALTER TABLE "{table}" ADD CONSTRAINT "{constraint}" '
+                f'UNIQUE USING INDEX "{constraint}"')
+
+    def backwards(apps, schema_editor):
+        schema_editor.execute(
+            f'ALTER TABLE "{table}" DROP CONSTRAINT "{constraint}"')
+
+    return migrations.RunPython(forwards, backwards)
+
+
+def drop_invalid_recipe_index(apps, schema_editor):
+    """Let AddIndexConcurrently rebuild an index left INVALID"""
+    with schema_editor.connection.cursor() as cursor:
+        drop_invalid_index(cursor, 'core_recipe_user_id_idx')
+
+
+class Migration(migrations.Migration):
+
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_names, migrations.RunPython.noop),
+        migrations.RunPython(
+            drop_invalid_recipe_index, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(
+                fields=['user', '-id'], name='core_recipe_user_id_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                add_unique_concurrently(
+                    'core_ingredient', 'core_ingredient_user_name_uniq'),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='ingredient',
+                    constraint=models.UniqueConstraint(
+                        fields=('user', 'name'),
+                        name='core_ingredient_user_name_uniq'
+                    ),
+                ),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                add_unique_concurrently(
+                    'core_tag', 'core_tag_user_name_uniq'),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='tag',
+                    constraint=models.UniqueConstraint(
+                        fields=('user', 'name'),
+                        name='core_tag_user_name_uniq'
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,58 @@
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('pg_catalog.english', "
+    "coalesce({row}title, '')), 'A') || "
+    "setweight(to_tsvector('pg_catalog.english', "
+    "coalesce({row}description, '')), 'B')"
+)
+
+CREATE_TRIGGER = f"""
+CREATE FUNCTION core_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {SEARCH_VECTOR.format(row='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_recipe_search_vector_trigger
+BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+FOR EACH ROW EXECUTE PROCEDURE core_recipe_search_vector_update();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER IF EXISTS core_recipe_search_vector_trigger ON core_recipe;
+DROP FUNCTION IF EXISTS core_recipe_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0014_recipe_attr_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.RunSQL(
+            f"UPDATE core_recipe SET search_vector = "
+            f"{SEARCH_VECTOR.format(row='')}",
+            migrations.RunSQL.noop,
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='core_recipe_search_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-17 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('variants', models.JSONField(blank=True, default=dict)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+
+CONSTRAINT = 'core_recipe_user_import_key_uniq'
+
+
+def add_unique_import_key(apps, schema_editor):
+    """Build the unique index without locking writes, then attach it
+
+    An INVALID index left by a failed concurrent build is dropped first,
+    IF NOT EXISTS would keep it and ADD CONSTRAINT rejects it. Steps
+    already done by an earlier, failed run are skipped.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_constraint WHERE conname = %s', [CONSTRAINT])
+        if cursor.fetchone() is not None:
+            return
+        cursor.execute(
+            'SELECT indisvalid FROM pg_index '
+            'WHERE indexrelid = to_regclass(%s)', [CONSTRAINT])
+        row = cursor.fetchone()
+        if row is not None and not row[0]:
+            cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{CONSTRAINT}"')
+        cursor.execute(
+            f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{CONSTRAINT}" '
+            f'ON "core_recipe" ("user_id", "import_key")')
+        cursor.execute(
+            f'ALTER TABLE "core_recipe" ADD CONSTRAINT "{CONSTRAINT}" '
+            f'UNIQUE USING INDEX "{CONSTRAINT}"')
+
+
+def drop_unique_import_key(apps, schema_editor):
+    schema_editor.execute(
+        f'ALTER TABLE "core_recipe" DROP CONSTRAINT "{CONSTRAINT}"')
+
+
+class Migration(migrations.Migration):
+
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0018_storedimage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='import_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(
+                    add_unique_import_key, drop_unique_import_key),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='recipe',
+                    constraint=models.UniqueConstraint(
+                        fields=('user', 'import_key'),
+                        name='core_recipe_user_import_key_uniq'
+                    ),
+                ),
+            ],
+        ),
+    ]
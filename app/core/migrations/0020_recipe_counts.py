@@ -0,0 +1,46 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+def count_links(table, column):
+    """Set recipe_count of every row from the links of the through table"""
+    return migrations.RunSQL(
+        sql=f'UPDATE "core_{table}" SET "recipe_count" = counts.links '
+            f'FROM (SELECT "{column}" AS id, COUNT(*) AS links '
+            f'FROM "core_recipe_{table}s" GROUP BY 1) AS counts '
+            f'WHERE "core_{table}"."id" = counts.id',
+        reverse_sql=migrations.RunSQL.noop,
+    )
+
+
+class Migration(migrations.Migration):
+
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0019_recipe_import_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        count_links('ingredient', 'ingredient_id'),
+        count_links('tag', 'tag_id'),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'recipe_count', 'name'], name='core_ingredient_user_count_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tag',
+            index=models.Index(condition=models.Q(('recipe_count__gt', 0)), fields=['user', 'recipe_count', 'name'], name='core_tag_user_count_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import DatabaseError, migrations
+
+TABLES = ['core_tag', 'core_ingredient']
+
+
+def add_trigram_indexes(apps, schema_editor):
+    """Index upper case names for autocomplete if pg_trgm can be installed
+
+    The gin_trgm_ops index serves both LIKE 'PREFIX%' and similarity
+    lookups. Without the extension autocomplete scans the user's names.
+    """
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+        try:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except DatabaseError:
+            # Not allowed for the migrating role
+            return
+        for table in TABLES:
+            # IF NOT EXISTS would keep an INVALID index of a failed build
+            cursor.execute(
+                'SELECT indisvalid FROM pg_index '
+                'WHERE indexrelid = to_regclass(%s)',
+                [f'{table}_name_trgm_idx']
+            )
+            row = cursor.fetchone()
+            if row is not None and not row[0]:
+                cursor.execute(
+                    f'DROP INDEX CONCURRENTLY IF EXISTS '
+                    f'"{table}_name_trgm_idx"')
+            cursor.execute(
+                f'CREATE INDEX CONCURRENTLY IF NOT EXISTS '
+                f'"{table}_name_trgm_idx" ON "{table}" '
+                f'USING gin (UPPER("name") gin_trgm_ops)'
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    """Drop the autocomplete indexes, keeping the extension"""
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            cursor.execute(
+                f'DROP INDEX CONCURRENTLY IF EXISTS "{table}_name_trgm_idx"')
+
+
+class Migration(migrations.Migration):
+
+    # Concurrent index builds cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0020_recipe_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_trigram_indexes, drop_trigram_indexes),
+    ]
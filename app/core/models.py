@@ -5,7 +5,13 @@ Database Models
 import uuid
 import os
 
-from django.db import models
+from django.db import connections, models, router
+from django.db.models.functions import Coalesce, Greatest, Upper
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import (
+    SearchVectorField,
+    TrigramSimilarity
+)
 from django.contrib.auth.models import (
     AbstractBaseUser,
     PermissionsMixin,
@@ -58,9 +64,186 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+# Databases by alias, whether pg_trgm is installed
+_has_trigram = {}
+
+
+def has_trigram(using='default'):
+    """ Return whether pg_trgm is installed, checked once per process """
+    if using not in _has_trigram:
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+            _has_trigram[using] = cursor.fetchone() is not None
+    return _has_trigram[using]
+
+
+class RecipeAttrManager(models.Manager):
+    """ Manager for per user recipe attributes (tags and ingredients) """
+
+    def get_or_create_many(self, user, names):
+        """ Return a name to object map, creating missing names in bulk """
+        names = list(dict.fromkeys(names))
+        found = {}
+
+        for obj in self.filter(user=user, name__in=names).order_by('id'):
+            found.setdefault(obj.name, obj)
+
+        missing = [name for name in names if name not in found]
+        if missing:
+            # ON CONFLICT DO NOTHING leaves rows created concurrently by
+            # another request in place; they are picked up by the re-select
+            self.bulk_create(
+                [self.model(user=user, name=name) for name in missing],
+                ignore_conflicts=True
+            )
+            created = self.filter(
+                user=user, name__in=missing).order_by('id')
+            for obj in created:
+                found.setdefault(obj.name, obj)
+
+        return found
+
+    def autocomplete(self, user, term, limit):
+        """ Return up to limit (id, name) of the user's objects matching
+        term, ignoring case
+
+        Names starting with term come first, most used first. Remaining
+        places go to names similar to term with pg_trgm, else to names
+        containing it. Both use the trigram index on UPPER(name) when
+        pg_trgm is installed.
+        """
+        queryset = self.filter(user=user)
+        matches = list(
+            queryset.filter(name__istartswith=term)
+            .order_by('-recipe_count', 'name')
+            .values_list('id', 'name')[:limit]
+        )
+        if len(matches) == limit or len(term) < 3:
+            return matches
+
+        others = self._similar(
+            queryset.exclude(name__istartswith=term), term)
+        return matches + list(
+            others.values_list('id', 'name')[:limit - len(matches)])
+
+    def _similar(self, queryset, term):
+        """ Return objects of queryset similar to term, best match first """
+        if has_trigram(self.db):
+            return queryset.annotate(
+                upper_name=Upper('name'),
+                similarity=TrigramSimilarity(Upper('name'), term.upper())
+            ).filter(upper_name__trigram_similar=term.upper()).order_by(
+                '-similarity', '-recipe_count', 'name')
+        return queryset.filter(name__icontains=term).order_by(
+            '-recipe_count', 'name')
+
+    def _link_field(self):
+        """ Return the Recipe many to many field linking to the model """
+        return self.model._meta.get_field('recipe').field
+
+    def _count_changed_links(self, changed_sql, params, sign):
+        """ Run a statement changing links and returning the linked ids,
+        adding or subtracting the changed links to recipe_count
+
+        Both happen in one statement, so counts move with the links and
+        concurrent writers add to the latest count.
+        """
+        table = self.model._meta.db_table
+        column = self._link_field().m2m_reverse_name()
+        using = self._db or router.db_for_write(self.model, **self._hints)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'WITH changed AS ({changed_sql} RETURNING "{column}") '
+                f'UPDATE "{table}" SET "recipe_count" = GREATEST('
+                f'"recipe_count" {sign} counts.links, 0) '
+                f'FROM (SELECT "{column}" AS id, COUNT(*) AS links '
+                f'FROM changed GROUP BY 1) AS counts '
+                f'WHERE "{table}"."id" = counts.id',
+                params
+            )
+
+    def add_links(self, links):
+        """ Link (recipe id, object id) pairs, skipping existing links,
+        and count the new links in recipe_count
+
+        Passing two id arrays to unnest() skips building a model instance
+        and SQL placeholders per link.
+        """
+        if not links:
+            return
+        field = self._link_field()
+        recipe_ids, ids = zip(*links)
+        self._count_changed_links(
+            f'INSERT INTO "{field.m2m_db_table()}" '
+            f'("{field.m2m_column_name()}", "{field.m2m_reverse_name()}") '
+            'SELECT * FROM unnest(%s::bigint[], %s::bigint[]) '
+            'ON CONFLICT DO NOTHING',
+            [list(recipe_ids), list(ids)],
+            '+'
+        )
+
+    def remove_links(self, recipe_ids, ids=None):
+        """ Unlink recipes from objects, from every object without ids,
+        and uncount the removed links in recipe_count """
+        field = self._link_field()
+        sql = (
+            f'DELETE FROM "{field.m2m_db_table()}" '
+            f'WHERE "{field.m2m_column_name()}" = ANY(%s::bigint[])'
+        )
+        params = [list(recipe_ids)]
+        if ids is not None:
+            sql += f' AND "{field.m2m_reverse_name()}" = ANY(%s::bigint[])'
+            params.append(list(ids))
+        self._count_changed_links(sql, params, '-')
+
+    def change_counts(self, changes):
+        """ Add {object id: links} changes to recipe_count """
+        by_change = {}
+        for obj_id, change in changes.items():
+            by_change.setdefault(change, []).append(obj_id)
+        for change, ids in by_change.items():
+            self.filter(id__in=ids).update(
+                recipe_count=Greatest(models.F('recipe_count') + change, 0))
+
+    def repair_counts(self, **lookup):
+        """ Recount recipe_count of objects matching lookup from their
+        links, return how many were wrong """
+        through = self._link_field().remote_field.through
+        column = self._link_field().m2m_reverse_field_name()
+        actual = Coalesce(
+            models.Subquery(
+                through.objects.filter(**{column: models.OuterRef('pk')})
+                .order_by().values(column)
+                .annotate(links=models.Count('*')).values('links')
+            ),
+            0
+        )
+        wrong = list(
+            self.filter(**lookup).annotate(actual=actual).exclude(
+                recipe_count=models.F('actual')).values_list('pk', flat=True)
+        )
+        if wrong:
+            self.filter(pk__in=wrong).update(recipe_count=actual)
+        return len(wrong)
+
+
 class Recipe(models.Model):
     """ Recipe model """
 
+    IMAGE_NONE = 'none'
+    IMAGE_PENDING = 'pending'
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUS_CHOICES = [
+        (IMAGE_NONE, 'No image'),
+        (IMAGE_PENDING, 'Pending'),
+        (IMAGE_PROCESSING, 'Processing'),
+        (IMAGE_READY, 'Ready'),
+        (IMAGE_FAILED, 'Failed'),
+    ]
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE
@@ -75,6 +258,39 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient')
 
     image = models.ImageField(null=True, upload_to=generate_image_path)
+    # Resized copies of image, built in the background (recipe/images.py)
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUS_CHOICES,
+        default=IMAGE_NONE
+    )
+    image_variants = models.JSONField(default=dict, blank=True)
+
+    # Weighted title/description vector, kept up to date by a database
+    # trigger (see migration 0015) so bulk writes are covered too
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    # Also touched when a linked tag or ingredient changes, so it can back
+    # Last-Modified/ETag validators of the recipe detail
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Source row identity of imported recipes, makes re-imports idempotent
+    import_key = models.CharField(
+        max_length=255, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Recipe lists filter by user and page newest first
+            models.Index(
+                fields=['user', '-id'], name='core_recipe_user_id_idx'),
+            GinIndex(fields=['search_vector'], name='core_recipe_search_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'import_key'],
+                name='core_recipe_user_import_key_uniq'
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -87,6 +303,31 @@ class Tag(models.Model):
     )
 
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Number of linked recipes, maintained by RecipeAttrManager link
+    # methods and recipe signals, fixed by repair_recipe_counts
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        indexes = [
+            # Serves assigned_only ordered by name or recipe_count,
+            # unused items stay out of it
+            models.Index(
+                fields=['user', 'recipe_count', 'name'],
+                name='core_tag_user_count_idx',
+                condition=models.Q(recipe_count__gt=0)
+            ),
+            # With pg_trgm, migration 0021 adds core_tag_name_trgm_idx
+            # for autocomplete, on an expression with an operator class
+        ]
+        constraints = [
+            # Also serves the per user lookup by name and unfiltered lists
+            # ordered by name; assigned_only lists use the partial index
+            models.UniqueConstraint(
+                fields=['user', 'name'], name='core_tag_user_name_uniq'),
+        ]
 
     def __str__(self):
         return self.name
@@ -99,6 +340,47 @@ class Ingredient(models.Model):
     )
 
     name = models.CharField(max_length=255)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Number of linked recipes, maintained by RecipeAttrManager link
+    # methods and recipe signals, fixed by repair_recipe_counts
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        indexes = [
+            # Serves assigned_only ordered by name or recipe_count,
+            # unused items stay out of it
+            models.Index(
+                fields=['user', 'recipe_count', 'name'],
+                name='core_ingredient_user_count_idx',
+                condition=models.Q(recipe_count__gt=0)
+            ),
+            # With pg_trgm, migration 0021 adds core_ingredient_name_trgm_idx
+            # for autocomplete, on an expression with an operator class
+        ]
+        constraints = [
+            # Also serves the per user lookup by name and unfiltered lists
+            # ordered by name; assigned_only lists use the partial index
+            models.UniqueConstraint(
+                fields=['user', 'name'],
+                name='core_ingredient_user_name_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class StoredImage(models.Model):
+    """ Content addressed image file shared by the recipes using it """
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    # Storage name, equal to Recipe.image of every recipe referencing it
+    name = models.CharField(max_length=255, unique=True)
+    variants = models.JSONField(default=dict, blank=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    released_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
@@ -0,0 +1,82 @@
+"""
+On-disk store of request profiles
+
+ProfilingMiddleware saves a cProfile dump and a JSON file of request
+details per profile in PROFILE_DIR. Only the newest PROFILE_MAX_COUNT
+profiles are kept. Profile ids start with a microsecond timestamp, so
+they sort from oldest to newest.
+"""
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+from django.conf import settings
+
+PROFILE_ID_RE = re.compile(r'^\d+-[0-9a-f]{8}$')
+
+SORT_KEYS = ['cumulative', 'tottime', 'ncalls']
+
+
+def _path(profile_id, extension):
+    """Return the path of a file of a profile"""
+    return os.path.join(settings.PROFILE_DIR, f'{profile_id}.{extension}')
+
+
+def save_profile(profiler, details):
+    """Save a finished profiler with details of the request, return its id"""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    profile_id = f'{time.time_ns() // 1000}-{uuid.uuid4().hex[:8]}'
+    profiler.dump_stats(_path(profile_id, 'prof'))
+    with open(_path(profile_id, 'json'), 'w') as meta:
+        json.dump(details, meta)
+    prune_profiles()
+    return profile_id
+
+
+def profile_ids():
+    """Return the ids of the stored profiles, newest first"""
+    try:
+        names = os.listdir(settings.PROFILE_DIR)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        (
+            name[:-len('.prof')] for name in names
+            if name.endswith('.prof') and
+            PROFILE_ID_RE.match(name[:-len('.prof')])
+        ),
+        reverse=True
+    )
+
+
+def prune_profiles():
+    """Delete the oldest profiles over PROFILE_MAX_COUNT"""
+    for profile_id in profile_ids()[settings.PROFILE_MAX_COUNT:]:
+        for extension in ('prof', 'json'):
+            try:
+                os.remove(_path(profile_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+def load_details(profile_id):
+    """Return the request details of a profile, None if it is missing"""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(_path(profile_id, 'json')) as meta:
+            return json.load(meta)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def top_functions(profile_id, sort='cumulative', limit=40):
+    """Return the pstats report of the top functions of a profile"""
+    output = io.StringIO()
+    stats = pstats.Stats(_path(profile_id, 'prof'), stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,105 @@
+"""
+orjson backed JSON renderer and parser for the API
+
+Output decodes to the same values as rest_framework's JSONRenderer
+output: types orjson does not encode natively, as well as dates and
+times, go through DRF's JSONEncoder.default. Bytes can differ in float
+formatting, e.g. orjson writes 1e16 where the stdlib writes 1e+16.
+Values orjson cannot encode, like integers beyond 64 bits, and NaN or
+infinite floats, which orjson would write as null, are left to
+JSONRenderer so they render or raise exactly like DRF. Indented output
+(the browsable API, 'indent=' media type params) and a missing orjson
+fall back to the stdlib based DRF classes too.
+"""
+import math
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+_encoder = encoders.JSONEncoder()
+
+if orjson is not None:
+    DUMPS_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def _has_non_finite(data):
+    """Return whether data holds a NaN or infinite float"""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+def json_dumps(data):
+    """Return data as compact UTF-8 JSON bytes, encoded like DRF does"""
+    if orjson is None:
+        return JSONRenderer().render(data)
+
+    try:
+        ret = orjson.dumps(
+            data, default=_encoder.default, option=DUMPS_OPTIONS)
+    except orjson.JSONEncodeError:
+        return JSONRenderer().render(data)
+    # orjson writes NaN and infinity as null where DRF refuses them
+    if b'null' in ret and _has_non_finite(data):
+        return JSONRenderer().render(data)
+    # Like JSONRenderer, keep the output a strict javascript subset
+    if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+        ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028')
+        ret = ret.replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer encoding with orjson when the output allows it"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        fast = (
+            orjson is not None and
+            self.compact and
+            not self.ensure_ascii and
+            self.get_indent(
+                accepted_media_type, renderer_context or {}) is None
+        )
+        if not fast:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return json_dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser decoding with orjson"""
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            data = stream.read()
+            if encoding.lower().replace('-', '') != 'utf8':
+                data = data.decode(encoding)
+            return orjson.loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
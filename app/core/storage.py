@@ -0,0 +1,38 @@
+"""
+File storage for content addressed files
+"""
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """ File system storage where a name always holds the same content
+
+    Saving a name that exists keeps the existing file, since it holds the
+    same bytes. New files are written to a temporary file and renamed into
+    place, so concurrent saves of a name never see a partial file.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            os.chmod(tmp_path, self.file_permissions_mode or 0o644)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return name
@@ -0,0 +1,30 @@
+"""
+Test runner keeping request timing out of the test run
+"""
+import logging
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner with request sampling and timing log lines off
+
+    ServerTimingMiddleware samples requests at random, so tests would
+    time and log a varying share of their requests. Tests of the timing
+    enable it with override_settings(SERVER_TIMING_SAMPLE_RATE=...), and
+    assertLogs still captures the lines.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._sampling = override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+        self._sampling.enable()
+        self._logger = logging.getLogger('core.middleware')
+        self._log_level = self._logger.level
+        self._logger.setLevel(logging.WARNING)
+
+    def teardown_test_environment(self, **kwargs):
+        self._logger.setLevel(self._log_level)
+        self._sampling.disable()
+        super().teardown_test_environment(**kwargs)
@@ -4,15 +4,26 @@ Test custom Django management commands.
 """
 
 
+import json
+import os
+import tempfile
+import threading
+import time
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 
+from django.db import connection, transaction
 from django.db.utils import OperationalError
 
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from core.models import Recipe, Tag
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -40,3 +51,256 @@ class CommandTests(SimpleTestCase):
         self.assertEqual(patched_check.call_count, 6)
 
         patched_check.assert_called_with(databases=['default'])
+
+
+class BenchmarkCommandTests(TestCase):
+    """ Test benchmark commands."""
+
+    def test_benchmark_recipe_writes(self):
+        """ Test recipe write benchmark reports both strategies """
+        out = StringIO()
+
+        call_command(
+            'benchmark_recipe_writes', tags=2, ingredients=2, runs=2,
+            stdout=out)
+
+        self.assertIn('per item', out.getvalue())
+        self.assertIn('batched', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_token_auth(self):
+        """ Test token auth benchmark reports both authentications """
+        out = StringIO()
+
+        call_command('benchmark_token_auth', requests=5, stdout=out)
+
+        self.assertIn('token', out.getvalue())
+        self.assertIn('cached', out.getvalue())
+
+    def test_benchmark_renderers(self):
+        """ Test renderer benchmark reports both renderers """
+        out = StringIO()
+
+        call_command('benchmark_renderers', sizes=[5], runs=1, stdout=out)
+
+        self.assertIn('5 recipes', out.getvalue())
+        self.assertIn('fast', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_recipe_list(self):
+        """ Test list benchmark reports both serializers """
+        out = StringIO()
+
+        call_command('benchmark_recipe_list', sizes=[5], runs=1, stdout=out)
+
+        self.assertIn('serializer: 3 queries', out.getvalue())
+        self.assertIn('rows: 3 queries', out.getvalue())
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_benchmark_uploads(self):
+        """ Test upload benchmark reports peak memory of a mode """
+        out = StringIO()
+
+        call_command(
+            'benchmark_uploads', mode='streaming', concurrency=2,
+            size_mb=0.1, stdout=out)
+
+        self.assertIn('streaming: 2 x', out.getvalue())
+        self.assertIn('0 rejected', out.getvalue())
+
+    def test_benchmark_api(self):
+        """ Test API benchmark reports each scenario and cleans up """
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, 'results.json')
+            call_command(
+                'benchmark_api', users=2, recipes=3, tags=2, ingredients=3,
+                requests=4, concurrency=1, output=output,
+                scenarios=['token', 'me', 'recipe-list', 'recipe-detail'],
+                stdout=out)
+            with open(output) as results:
+                report = json.load(results)
+
+        self.assertEqual(
+            sorted(report['scenarios']),
+            ['me', 'recipe-detail', 'recipe-list', 'token'])
+        for result in report['scenarios'].values():
+            self.assertEqual(result['requests'], 4)
+            self.assertEqual(result['errors'], 0)
+            self.assertIn('p99', result['latency_ms'])
+        self.assertIn('recipe-list:', out.getvalue())
+        self.assertFalse(get_user_model().objects.exists())
+
+
+class ImportRecipesCommandTests(TestCase):
+    """ Test bulk importing recipes."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='import@example.com', password='testpass123')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def _import(self, *paths, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            'import_recipes', *paths, user=self.user.email,
+            stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_import_jsonl(self):
+        """ Test JSONL rows are imported with nested tags and ingredients """
+        Tag.objects.create(user=self.user, name='Vegan')
+        rows = [
+            {'id': 1, 'title': 'Soup', 'time_minutes': 10, 'price': '5.00',
+             'tags': ['Vegan', 'Quick'], 'ingredients': ['Salt']},
+            {'id': 2, 'title': 'Pie', 'time_minutes': 60, 'price': '8.50',
+             'tags': [{'id': 9, 'name': 'Vegan'}]},
+        ]
+        path = self._write(
+            'recipes.jsonl', '\n'.join(json.dumps(row) for row in rows))
+
+        out, err = self._import(path, batch_size=1)
+
+        self.assertIn('Imported 2 recipes', out)
+        self.assertIn('rows/s', out)
+        self.assertEqual(err, '')
+        soup = Recipe.objects.get(user=self.user, title='Soup')
+        self.assertEqual(
+            sorted(soup.tags.values_list('name', flat=True)),
+            ['Quick', 'Vegan'])
+        self.assertEqual(soup.ingredients.get().name, 'Salt')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recipe_count')),
+            {'Vegan': 2, 'Quick': 1})
+
+    def test_import_csv(self):
+        """ Test CSV rows with '|' separated names are imported """
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price,tags,ingredients\n'
+            '"Soup, hot",10,5.00,Vegan|Quick,Salt\n'
+        ))
+
+        self._import(path)
+
+        soup = Recipe.objects.get(user=self.user)
+        self.assertEqual(soup.title, 'Soup, hot')
+        self.assertEqual(soup.tags.count(), 2)
+
+    def test_reimport_is_idempotent(self):
+        """ Test importing the same file twice creates recipes once """
+        path = self._write('recipes.csv', (
+            'title,time_minutes,price,tags\n'
+            'Soup,10,5.00,Vegan\n'
+            'Pie,60,8.50,\n'
+        ))
+        self._import(path)
+
+        out, _ = self._import(path)
+
+        self.assertIn('Imported 0 recipes, skipped 2', out)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_invalid_rows_reported(self):
+        """ Test invalid rows are reported and valid rows still imported """
+        path = self._write('recipes.jsonl', '\n'.join([
+            json.dumps({'title': 'Soup', 'time_minutes': 10, 'price': 5}),
+            json.dumps({'title': 'No time', 'price': 5}),
+            json.dumps({'title': 'Bad', 'time_minutes': 'x', 'price': 5}),
+            'not json',
+        ]))
+
+        out, err = self._import(path)
+
+        self.assertIn('3 failed', out)
+        self.assertIn('recipes.jsonl:2', err)
+        self.assertIn('recipes.jsonl:4', err)
+        self.assertEqual(Recipe.objects.get(user=self.user).title, 'Soup')
+
+    def test_unknown_user_rejected(self):
+        """ Test an unknown --user is an error """
+        with self.assertRaises(CommandError):
+            call_command(
+                'import_recipes', 'missing.jsonl', user='no@example.com')
+
+
+class ConcurrentImportTests(TransactionTestCase):
+    """ Test imports of the same rows running at the same time """
+
+    def test_rows_committed_meanwhile_skipped(self):
+        """ Test rows another import creates first count as skipped """
+        user = get_user_model().objects.create_user(
+            email='import@example.com', password='testpass123')
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, 'recipes.csv')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('id,title,time_minutes,price,tags\n'
+                    '1,Soup,10,5.00,Vegan\n'
+                    '2,Pie,60,8.50,Vegan\n')
+        imported, release = threading.Event(), threading.Event()
+        outputs = {}
+
+        def run(name, hold=False):
+            out = StringIO()
+            try:
+                with transaction.atomic():
+                    call_command(
+                        'import_recipes', path, user=user.email, stdout=out)
+                    if hold:
+                        imported.set()
+                        release.wait(5)
+            finally:
+                connection.close()
+            outputs[name] = out.getvalue()
+
+        first = threading.Thread(target=run, args=['first', True])
+        second = threading.Thread(target=run, args=['second'])
+        first.start()
+        imported.wait(5)
+        second.start()
+        # Let the second import reach the rows before the first commits
+        time.sleep(0.2)
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertIn('Imported 2 recipes, skipped 0', outputs['first'])
+        self.assertIn('Imported 0 recipes, skipped 2', outputs['second'])
+        self.assertEqual(Recipe.objects.filter(user=user).count(), 2)
+        self.assertEqual(Tag.objects.get(user=user).recipe_count, 2)
+
+
+class RepairRecipeCountsCommandTests(TestCase):
+    """ Test recounting recipe_count of tags and ingredients """
+
+    def test_repair_recipe_counts(self):
+        """ Test drifted counts are fixed and reported """
+        user = get_user_model().objects.create_user(
+            email='repair@example.com', password='testpass123')
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=1)
+        tags = [
+            Tag.objects.create(user=user, name=name)
+            for name in ('Vegan', 'Quick', 'Cheap')
+        ]
+        recipe.tags.add(tags[0])
+        # Links and counts changed behind the ORM
+        Recipe.tags.through.objects.create(recipe=recipe, tag=tags[1])
+        Tag.objects.filter(id=tags[2].id).update(recipe_count=4)
+        out = StringIO()
+
+        call_command('repair_recipe_counts', batch_size=2, stdout=out)
+
+        self.assertIn('Fixed recipe_count of 2 tags', out.getvalue())
+        self.assertIn('Fixed recipe_count of 0 ingredients', out.getvalue())
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'recipe_count')),
+            {'Vegan': 1, 'Quick': 1, 'Cheap': 0})
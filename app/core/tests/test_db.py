@@ -0,0 +1,127 @@
+"""
+Test connection pooling and health checks of the database backend
+"""
+import threading
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """ Stand in for a DB-API connection """
+
+    def __init__(self, usable=True):
+        self.usable = usable
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """ Test the per process connection pool """
+
+    def test_checkin_reuses_connection(self):
+        """ Test a checked in connection is handed out again """
+        pool = ConnectionPool(max_size=2)
+        conn = pool.checkout(FakeConnection)
+        pool.checkin(conn)
+
+        again = pool.checkout(FakeConnection)
+
+        self.assertIs(again, conn)
+        stats = pool.stats()
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['connects'], 1)
+
+    def test_checkout_times_out_when_exhausted(self):
+        """ Test checkout waits and then raises when the pool is full """
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        pool.checkout(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            pool.checkout(FakeConnection)
+
+        stats = pool.stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+
+    def test_discarded_connection_frees_slot(self):
+        """ Test discarding a connection lets a new one be made """
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        conn = pool.checkout(FakeConnection)
+        pool.checkin(conn, discard=True)
+
+        again = pool.checkout(FakeConnection)
+
+        self.assertIsNot(again, conn)
+        self.assertTrue(conn.closed)
+
+    def test_idle_connections_evicted(self):
+        """ Test connections idle for longer than max_idle are closed """
+        pool = ConnectionPool(max_size=2, max_idle=60)
+        conn = pool.checkout(FakeConnection)
+        pool.checkin(conn)
+
+        with patch('core.db.pool.time.monotonic', return_value=1e12):
+            again = pool.checkout(FakeConnection)
+
+        self.assertIsNot(again, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['evictions'], 1)
+
+    def test_failed_health_check_reconnects(self):
+        """ Test an idle connection failing its check is replaced """
+        pool = ConnectionPool(max_size=1, check=lambda conn: conn.usable)
+        conn = pool.checkout(FakeConnection)
+        conn.usable = False
+        pool.checkin(conn)
+
+        again = pool.checkout(FakeConnection)
+
+        self.assertIsNot(again, conn)
+        self.assertEqual(pool.stats()['reconnects'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_health_check_runs_without_lock(self):
+        """ Test other threads can check in while a check is running """
+        checked_in = []
+
+        def check(conn):
+            other = FakeConnection()
+            thread = threading.Thread(target=pool.checkin, args=[other])
+            thread.start()
+            thread.join(timeout=1)
+            checked_in.append(not thread.is_alive())
+            return True
+
+        pool = ConnectionPool(max_size=2, check=check)
+        pool.checkin(pool.checkout(FakeConnection))
+
+        pool.checkout(FakeConnection)
+
+        self.assertEqual(checked_in, [True])
+        self.assertEqual(pool.stats()['idle'], 1)
+
+
+class HealthCheckTests(TransactionTestCase):
+    """ Test the backend replaces broken persistent connections """
+
+    def test_broken_connection_replaced(self):
+        """ Test a connection closed under Django is reopened """
+        with patch.dict(connection.settings_dict, HEALTH_CHECKS=True):
+            connection.ensure_connection()
+            broken = connection.connection
+            broken.close()
+            connection.health_check_done = False
+
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                row = cursor.fetchone()
+
+        self.assertEqual(row, (1,))
+        self.assertIsNot(connection.connection, broken)
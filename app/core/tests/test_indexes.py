@@ -0,0 +1,61 @@
+"""
+Test hot path queries are served by the per user indexes.
+"""
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from core import models
+
+
+class IndexUsageTests(TestCase):
+    """ Testing query plans of the per user access paths """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='index@example.com',
+            password='testpass123'
+        )
+        # Tables are tiny in tests, make the planner prefer any index
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def assertUsesIndex(self, queryset, index_name):
+        """ Assert the query plan of queryset uses index_name """
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+
+    def test_recipe_list_uses_user_id_index(self):
+        """ Test listing recipes per user uses the composite index """
+        queryset = models.Recipe.objects.filter(
+            user=self.user).order_by('-id')
+
+        self.assertUsesIndex(queryset, 'core_recipe_user_id_idx')
+
+    def test_tag_lookup_uses_unique_index(self):
+        """ Test looking up a tag by name uses the unique index """
+        queryset = models.Tag.objects.filter(user=self.user, name='Vegan')
+
+        self.assertUsesIndex(queryset, 'core_tag_user_name_uniq')
+
+    def test_tag_list_uses_unique_index(self):
+        """ Test listing tags ordered by name uses the unique index """
+        queryset = models.Tag.objects.filter(
+            user=self.user).order_by('-name')
+
+        self.assertUsesIndex(queryset, 'core_tag_user_name_uniq')
+
+    def test_ingredient_lookup_uses_unique_index(self):
+        """ Test looking up ingredients by names uses the unique index """
+        queryset = models.Ingredient.objects.filter(
+            user=self.user, name__in=['Salt', 'Pepper'])
+
+        self.assertUsesIndex(queryset, 'core_ingredient_user_name_uniq')
+
+    def test_assigned_tags_use_count_index(self):
+        """ Test listing assigned tags by recipes uses the count index """
+        queryset = models.Tag.objects.filter(
+            user=self.user, recipe_count__gt=0).order_by('-recipe_count')
+
+        self.assertUsesIndex(queryset, 'core_tag_user_count_idx')
@@ -0,0 +1,145 @@
+"""
+Test the Prometheus metrics middleware and endpoint
+"""
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+METRICS_URL = reverse('metrics')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def sample(name, **labels):
+    """ Return the current value of a sample, 0 if not recorded yet """
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsMiddlewareTests(TestCase):
+    """ Test requests are recorded per endpoint """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='metrics@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_viewset_action_labels(self):
+        """ Test viewset requests are labelled basename.action """
+        recipe = Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=1)
+        upload_url = reverse('recipe:recipe-upload-image', args=[recipe.id])
+        before = sample(
+            'http_requests_total',
+            endpoint='recipe.upload_image', method='POST', status='400')
+        list_before = sample(
+            'http_request_duration_seconds_count',
+            endpoint='recipe.list', method='GET')
+
+        self.client.get(RECIPE_URL)
+        self.client.post(upload_url, {'image': 'none'})
+
+        self.assertEqual(sample(
+            'http_requests_total',
+            endpoint='recipe.upload_image', method='POST', status='400'),
+            before + 1)
+        self.assertEqual(sample(
+            'http_request_duration_seconds_count',
+            endpoint='recipe.list', method='GET'), list_before + 1)
+
+    def test_url_name_labels(self):
+        """ Test other views are labelled by URL name """
+        before = sample(
+            'http_requests_total',
+            endpoint='user.me', method='GET', status='200')
+
+        self.client.get(reverse('user:me'))
+
+        self.assertEqual(sample(
+            'http_requests_total',
+            endpoint='user.me', method='GET', status='200'), before + 1)
+
+    def test_db_queries_recorded(self):
+        """ Test the SQL queries of a request are counted """
+        before = sample(
+            'http_request_db_queries_sum', endpoint='tag.list')
+
+        self.client.get(reverse('recipe:tag-list'))
+
+        self.assertGreater(
+            sample('http_request_db_queries_sum', endpoint='tag.list'),
+            before)
+
+    def test_cache_hits_recorded(self):
+        """ Test response cache lookups are counted by outcome """
+        hits = sample('recipe_api_cache_requests_total', result='hits')
+
+        self.client.get(RECIPE_URL)
+        self.client.get(RECIPE_URL)
+
+        self.assertEqual(
+            sample('recipe_api_cache_requests_total', result='hits'),
+            hits + 1)
+
+
+class MetricsViewTests(TestCase):
+    """ Test the /metrics endpoint """
+
+    @override_settings(DEBUG=True)
+    def test_metrics_text_format(self):
+        """ Test metrics are served in the Prometheus text format """
+        self.client.get(METRICS_URL)
+        resp = self.client.get(METRICS_URL)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp['Content-Type'].startswith('text/plain'))
+        self.assertIn(b'http_requests_total{endpoint="metrics"', resp.content)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_token_required(self):
+        """ Test a configured token is required to read metrics """
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 401)
+
+        resp = self.client.get(
+            METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(resp.status_code, 200)
+
+    def test_metrics_closed_without_token(self):
+        """ Test metrics are not served without a token unless DEBUG """
+        resp = self.client.get(METRICS_URL)
+
+        self.assertEqual(resp.status_code, 404)
+
+    def test_multiprocess_aggregation(self):
+        """ Test counters of several processes are summed """
+        manage = str(settings.BASE_DIR / 'manage.py')
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': tmp}
+            for _ in range(2):
+                subprocess.run([
+                    sys.executable, manage, 'shell', '-c',
+                    'from core.metrics import REQUESTS; '
+                    'REQUESTS.labels("test", "GET", 200).inc()'
+                ], env=env, check=True)
+            output = subprocess.run([
+                sys.executable, manage, 'shell', '-c',
+                'from core.metrics import render_metrics; '
+                'print(render_metrics()[0].decode())'
+            ], env=env, check=True, capture_output=True, text=True).stdout
+
+        self.assertIn(
+            'http_requests_total{endpoint="test",method="GET",status="200"} '
+            '2.0',
+            output
+        )
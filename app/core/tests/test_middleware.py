@@ -0,0 +1,94 @@
+"""
+Test the Server-Timing middleware
+"""
+import logging
+import re
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.timing import server_timing
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def parse_server_timing(header):
+    """ Return {metric: (duration, description)} of a header value """
+    metrics = {}
+    for metric in header.split(', '):
+        name, *params = metric.split(';')
+        params = dict(param.split('=', 1) for param in params)
+        metrics[name] = (float(params['dur']), params.get('desc'))
+    return metrics
+
+
+@override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+class ServerTimingMiddlewareTests(TestCase):
+    """ Test timings of sampled requests """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='timing@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=1)
+
+    def test_header_reports_phases(self):
+        """ Test the header holds every phase and the query count """
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(RECIPE_URL)
+
+        metrics = parse_server_timing(resp['Server-Timing'])
+        self.assertEqual(
+            list(metrics), ['db', 'view', 'serialize', 'render', 'total'])
+        self.assertEqual(
+            metrics['db'][1], f'"{len(ctx.captured_queries)} queries"')
+        for name in ('view', 'render'):
+            self.assertLessEqual(metrics[name][0], metrics['total'][0])
+
+    def test_log_line(self):
+        """ Test a structured log line is written per request """
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            self.client.get(RECIPE_URL)
+
+        record = logs.records[0]
+        self.assertRegex(
+            record.getMessage(),
+            re.compile(r'^method=GET path=/api/recipe/recipes/ status=200 '
+                       r'queries=\d+ db_ms=[\d.]+ view_ms=[\d.]+'))
+        self.assertEqual(record.server_timing['status'], 200)
+
+    def test_log_line_has_handler(self):
+        """ Test the settings route timing lines to a handler """
+        middleware_logger = logging.getLogger('core.middleware')
+
+        self.assertTrue(middleware_logger.handlers)
+        self.assertFalse(middleware_logger.propagate)
+
+    def test_unrendered_response(self):
+        """ Test plain responses report view time without render """
+        resp = self.client.get(reverse('recipe:recipe-export'))
+
+        metrics = parse_server_timing(resp['Server-Timing'])
+        self.assertIn('view', metrics)
+        self.assertNotIn('render', metrics)
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        """ Test requests not sampled get no header """
+        resp = self.client.get(RECIPE_URL)
+
+        self.assertNotIn('Server-Timing', resp)
+
+    def test_server_timing_outside_request(self):
+        """ Test timing a block outside a sampled request is a no-op """
+        with server_timing('serialize'):
+            pass
@@ -0,0 +1,59 @@
+"""
+Test migrations can be rerun after a failed concurrent index build
+"""
+import importlib
+
+from django.db import IntegrityError, connection
+from django.test import TransactionTestCase
+
+attr_indexes = importlib.import_module(
+    'core.migrations.0014_recipe_attr_indexes')
+
+
+class AddUniqueConcurrentlyTests(TransactionTestCase):
+    """ Test attaching unique constraints built concurrently """
+
+    def setUp(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TABLE "test_names" ("user_id" int, "name" text)')
+            cursor.execute(
+                'INSERT INTO "test_names" VALUES (1, %s), (1, %s)',
+                ['Salt', 'Salt'])
+        self.addCleanup(self._drop_table)
+
+    def _drop_table(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS "test_names"')
+
+    def _migrate(self):
+        operation = attr_indexes.add_unique_concurrently(
+            'test_names', 'test_names_uniq')
+        with connection.schema_editor(atomic=False) as schema_editor:
+            operation.code(None, schema_editor)
+
+    def _constraints(self):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(
+                cursor, 'test_names')
+
+    def test_rerun_after_failed_build(self):
+        """ Test an INVALID index of a failed build is rebuilt """
+        with self.assertRaises(IntegrityError):
+            self._migrate()
+        self.assertIn('test_names_uniq', self._constraints())
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM "test_names" WHERE ctid = '
+                '(SELECT MAX(ctid) FROM "test_names")')
+        self._migrate()
+        self._migrate()
+
+        constraint = self._constraints()['test_names_uniq']
+        self.assertTrue(constraint['unique'])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indisvalid FROM pg_index WHERE "
+                "indexrelid = 'test_names_uniq'::regclass")
+            self.assertEqual(cursor.fetchone(), (True,))
@@ -2,7 +2,8 @@ from decimal import Decimal
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from unittest.mock import patch
-# from django.db.utils import IntegrityError
+from django.db import connections
+from django.db.utils import IntegrityError
 
 
 from core import models
@@ -72,6 +73,24 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(recipe), 'Recipe Title')
 
+    def test_recipe_search_vector_maintained(self):
+        """ Testing the recipe search vector follows title changes """
+
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user,
+            title='Lentil soup',
+            time_minutes=5,
+            price=Decimal('10.00')
+        )
+        recipe.title = 'Tomato soup'
+        recipe.save()
+
+        recipes = models.Recipe.objects.filter(search_vector='tomato')
+        self.assertEqual(list(recipes), [recipe])
+        self.assertFalse(
+            models.Recipe.objects.filter(search_vector='lentil').exists())
+
     def test_create_tag_successful(self):
         """ Test creating a new tag """
 
@@ -80,15 +99,15 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(tag), 'Vegan')
 
-    # def test_create_tag_with_existing_name_error(self):
-    #     """Test creating a tag with existing name raises error"""
+    def test_create_tag_with_existing_name_error(self):
+        """Test creating a tag with existing name raises error"""
 
-    #     user = create_user()
+        user = create_user()
 
-    #     models.Tag.objects.create(user=user, name='Vegan')
+        models.Tag.objects.create(user=user, name='Vegan')
 
-    #     with self.assertRaises(IntegrityError):
-    #         models.Tag.objects.create(user=user, name='Vegan')
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Vegan')
 
     def test_create_ingredient_successful(self):
         """Test create an ingredient"""
@@ -102,6 +121,109 @@ class ModelTests(TestCase):
             models.Ingredient.objects.filter(
                 user=user, name='Lettuce').exists())
 
+    def test_recipe_count_maintained(self):
+        """ Test recipe_count follows links changed from either side """
+        user = create_user()
+        vegan = models.Tag.objects.create(user=user, name='Vegan')
+        quick = models.Tag.objects.create(user=user, name='Quick')
+        soup, pie = [
+            models.Recipe.objects.create(
+                user=user, title=title, time_minutes=5, price=1)
+            for title in ('Soup', 'Pie')
+        ]
+
+        def counts():
+            return dict(models.Tag.objects.values_list('name', 'recipe_count'))
+
+        soup.tags.add(vegan, quick)
+        soup.tags.add(vegan)
+        vegan.recipe_set.add(pie)
+        self.assertEqual(counts(), {'Vegan': 2, 'Quick': 1})
+
+        soup.tags.remove(vegan, quick, quick)
+        vegan.recipe_set.remove(soup)
+        self.assertEqual(counts(), {'Vegan': 1, 'Quick': 0})
+
+        soup.tags.add(quick)
+        vegan.recipe_set.clear()
+        self.assertEqual(counts(), {'Vegan': 0, 'Quick': 1})
+
+        soup.delete()
+        self.assertEqual(counts(), {'Vegan': 0, 'Quick': 0})
+
+    def test_link_manager_methods(self):
+        """ Test bulk linking and unlinking keeps recipe_count """
+        user = create_user()
+        salt = models.Ingredient.objects.create(user=user, name='Salt')
+        recipes = [
+            models.Recipe.objects.create(
+                user=user, title=str(i), time_minutes=5, price=1)
+            for i in range(3)
+        ]
+
+        models.Ingredient.objects.add_links(
+            [(recipe.id, salt.id) for recipe in recipes] +
+            [(recipes[0].id, salt.id)])
+        salt.refresh_from_db()
+        self.assertEqual(salt.recipe_count, 3)
+
+        models.Ingredient.objects.remove_links(
+            [recipes[0].id, recipes[1].id], [salt.id])
+        salt.refresh_from_db()
+        self.assertEqual(salt.recipe_count, 1)
+        self.assertEqual(models.Ingredient.objects.repair_counts(), 0)
+
+    def test_link_manager_uses_its_database(self):
+        """ Test link statements run on the database of the manager """
+        user = create_user()
+        recipe = models.Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=Decimal('1.00'))
+        salt = models.Ingredient.objects.create(user=user, name='Salt')
+
+        with patch('core.models.connections') as patched_connections:
+            patched_connections.__getitem__.side_effect = (
+                lambda alias: connections[alias])
+            models.Ingredient.objects.db_manager('default').add_links(
+                [(recipe.id, salt.id)])
+
+        patched_connections.__getitem__.assert_called_with('default')
+        salt.refresh_from_db()
+        self.assertEqual(salt.recipe_count, 1)
+
+    @patch('core.models.has_trigram', return_value=True)
+    def test_autocomplete_similar_with_trigram(self, patched_has_trigram):
+        """ Test similar names are matched and ranked with pg_trgm """
+        queryset = models.Ingredient.objects.filter(user=create_user())
+
+        sql = str(models.Ingredient.objects._similar(
+            queryset, 'ginger').query)
+
+        self.assertIn('SIMILARITY(UPPER("core_ingredient"."name"), GINGER)',
+                      sql)
+        self.assertIn('UPPER("core_ingredient"."name") % GINGER', sql)
+        self.assertTrue(sql.endswith(
+            'ORDER BY "similarity" DESC, '
+            '"core_ingredient"."recipe_count" DESC, '
+            '"core_ingredient"."name" ASC'))
+
+    def test_autocomplete_similar_names(self):
+        """ Test names similar to the term follow the prefix matches """
+        if not models.has_trigram():
+            self.skipTest('pg_trgm is not installed')
+        user = create_user()
+        names = ('Ginger', 'Gingerbread', 'Pickled ginger', 'Salt')
+        ids = {
+            name: models.Ingredient.objects.create(user=user, name=name).id
+            for name in names
+        }
+
+        matches = models.Ingredient.objects.autocomplete(user, 'ginger', 10)
+
+        self.assertEqual(matches[:2], [
+            (ids['Ginger'], 'Ginger'), (ids['Gingerbread'], 'Gingerbread')])
+        self.assertIn((ids['Pickled ginger'], 'Pickled ginger'), matches)
+        self.assertNotIn((ids['Salt'], 'Salt'), matches)
+
     @patch('core.models.uuid.uuid4')
     def test_generate_image_path(self, patched_uuid):
         """ Test generating unique image path """
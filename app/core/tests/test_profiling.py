@@ -0,0 +1,173 @@
+"""
+Test profiling of staff requests and the profile admin pages
+"""
+import os
+import tempfile
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core import profiling
+from core.renderers import FastJSONRenderer
+from core.tests.test_middleware import parse_server_timing
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+class ProfilingTestCase(TestCase):
+    """ Store profiles in a temporary directory """
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.profile_dir = override_settings(PROFILE_DIR=tmp.name)
+        self.profile_dir.enable()
+        self.addCleanup(self.profile_dir.disable)
+
+        self.staff = get_user_model().objects.create_user(
+            email='staff@example.com',
+            password='testpass123',
+            is_staff=True
+        )
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123'
+        )
+
+
+class ProfilingMiddlewareTests(ProfilingTestCase):
+    """ Test which requests are profiled """
+
+    def get_recipes(self, user, **kwargs):
+        client = APIClient()
+        token = Token.objects.get_or_create(user=user)[0]
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client.get(RECIPE_URL, **kwargs)
+
+    def test_staff_request_profiled(self):
+        """ Test flagged staff requests are profiled and still answered """
+        resp = self.get_recipes(self.staff, HTTP_X_PROFILE='1')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), [])
+        profile_id = resp['X-Profile-Id']
+        self.assertEqual(profiling.profile_ids(), [profile_id])
+        details = profiling.load_details(profile_id)
+        self.assertEqual(details['path'], RECIPE_URL)
+        self.assertEqual(details['user'], self.staff.email)
+        self.assertIn('list', profiling.top_functions(profile_id))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_render_left_to_django(self):
+        """ Test profiled responses are rendered and timed as usual """
+        render = FastJSONRenderer.render
+
+        def slow_render(*args, **kwargs):
+            time.sleep(0.05)
+            return render(*args, **kwargs)
+
+        with patch.object(FastJSONRenderer, 'render', slow_render):
+            resp = self.get_recipes(self.staff, HTTP_X_PROFILE='1')
+
+        timing = parse_server_timing(resp['Server-Timing'])
+        self.assertGreaterEqual(timing['render'][0], 50)
+        self.assertIn(
+            'slow_render', profiling.top_functions(resp['X-Profile-Id']))
+
+    def test_query_flag(self):
+        """ Test the profile query parameter triggers profiling """
+        resp = self.get_recipes(self.staff, data={'profile': '1'})
+
+        self.assertIn('X-Profile-Id', resp)
+
+    def test_unflagged_request_not_profiled(self):
+        """ Test requests without the flag are not profiled """
+        resp = self.get_recipes(self.staff)
+
+        self.assertNotIn('X-Profile-Id', resp)
+        self.assertEqual(profiling.profile_ids(), [])
+
+    def test_non_staff_not_profiled(self):
+        """ Test the flag is ignored for users who are not staff """
+        resp = self.get_recipes(self.user, HTTP_X_PROFILE='1')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotIn('X-Profile-Id', resp)
+        self.assertEqual(profiling.profile_ids(), [])
+
+    def test_anonymous_not_profiled(self):
+        """ Test unauthenticated requests are not profiled """
+        resp = APIClient().get(RECIPE_URL, HTTP_X_PROFILE='1')
+
+        self.assertEqual(resp.status_code, 401)
+        self.assertNotIn('X-Profile-Id', resp)
+
+    @override_settings(PROFILE_MAX_COUNT=2)
+    def test_store_capped(self):
+        """ Test only the newest profiles are kept """
+        ids = [
+            self.get_recipes(self.staff, HTTP_X_PROFILE='1')['X-Profile-Id']
+            for _ in range(3)
+        ]
+
+        self.assertEqual(profiling.profile_ids(), ids[:0:-1])
+        self.assertEqual(len(os.listdir(settings.PROFILE_DIR)), 4)
+
+
+class ProfileAdminTests(ProfilingTestCase):
+    """ Test the profile admin pages """
+
+    def setUp(self):
+        super().setUp()
+        client = APIClient()
+        client.force_authenticate(self.staff)
+        self.profile_id = client.get(
+            RECIPE_URL, HTTP_X_PROFILE='1')['X-Profile-Id']
+        self.client.force_login(self.staff)
+
+    def test_profile_list(self):
+        """ Test profiles are listed with their request """
+        resp = self.client.get(reverse('profile-list'))
+
+        self.assertContains(resp, f'GET {RECIPE_URL}')
+        self.assertContains(
+            resp, reverse('profile-detail', args=[self.profile_id]))
+
+    def test_profile_detail(self):
+        """ Test a profile shows its top functions """
+        url = reverse('profile-detail', args=[self.profile_id])
+        resp = self.client.get(url, {'sort': 'tottime'})
+
+        self.assertContains(resp, 'function calls')
+        self.assertContains(resp, '<strong>tottime</strong>', html=True)
+
+    def test_unknown_profile(self):
+        """ Test unknown or malformed ids are not found """
+        for profile_id in ('1-00000000', '..'):
+            resp = self.client.get(
+                reverse('profile-detail', args=[profile_id]))
+            self.assertEqual(resp.status_code, 404)
+
+    def test_pruned_profile(self):
+        """ Test a profile pruned after its details were read is not found """
+        os.remove(os.path.join(
+            settings.PROFILE_DIR, f'{self.profile_id}.prof'))
+
+        resp = self.client.get(
+            reverse('profile-detail', args=[self.profile_id]))
+
+        self.assertEqual(resp.status_code, 404)
+
+    def test_staff_only(self):
+        """ Test the pages require a staff login """
+        self.client.force_login(self.user)
+
+        resp = self.client.get(reverse('profile-list'))
+
+        self.assertEqual(resp.status_code, 302)
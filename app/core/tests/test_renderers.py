@@ -0,0 +1,120 @@
+"""
+Test the orjson backed renderer and parser
+"""
+import datetime
+import io
+import json
+import uuid
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+
+from core.renderers import FastJSONParser, FastJSONRenderer
+
+PAYLOAD = {
+    'price': Decimal('5.50'),
+    'created': datetime.datetime(
+        2021, 6, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+    'day': datetime.date(2021, 6, 1),
+    'time': datetime.time(8, 15),
+    'duration': datetime.timedelta(minutes=90),
+    'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+    'lazy': gettext_lazy('Lazy text'),
+    'unicode': 'Crème brûlée \u2028 line',
+    'nested': ReturnDict([('tags', ('a', 'b'))], serializer=None),
+    1: None,
+}
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """ Test FastJSONRenderer output matches JSONRenderer """
+
+    def test_matches_json_renderer(self):
+        """ Test special types render exactly like DRF """
+        self.assertEqual(
+            FastJSONRenderer().render(PAYLOAD),
+            JSONRenderer().render(PAYLOAD)
+        )
+
+    def test_big_integer_falls_back(self):
+        """ Test integers orjson cannot encode render like DRF """
+        data = {'count': 2 ** 70, 'negative': -2 ** 64}
+
+        self.assertEqual(
+            FastJSONRenderer().render(data),
+            JSONRenderer().render(data)
+        )
+
+    def test_non_finite_float_raises(self):
+        """ Test NaN and infinity are refused like DRF does """
+        for value in (float('nan'), float('inf'), float('-inf')):
+            data = {'rows': [{'score': value, 'title': None}]}
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render(data)
+                with self.assertRaises(ValueError):
+                    FastJSONRenderer().render(data)
+
+    def test_float_values_match(self):
+        """ Test floats decode to the values DRF renders """
+        data = {'big': 1e16, 'small': 1.5e-7, 'plain': 0.1, 'none': None}
+
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data))
+        )
+
+    def test_indent_falls_back(self):
+        """ Test indented output is left to JSONRenderer """
+        media_type = 'application/json; indent=4'
+
+        self.assertEqual(
+            FastJSONRenderer().render(PAYLOAD, media_type),
+            JSONRenderer().render(PAYLOAD, media_type)
+        )
+
+    def test_without_orjson(self):
+        """ Test the stdlib is used when orjson is not installed """
+        with patch('core.renderers.orjson', None):
+            self.assertEqual(
+                FastJSONRenderer().render(PAYLOAD),
+                JSONRenderer().render(PAYLOAD)
+            )
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """ Test FastJSONParser decodes like JSONParser """
+
+    def _parse(self, parser, content, encoding='utf-8'):
+        return parser.parse(
+            io.BytesIO(content), parser_context={'encoding': encoding})
+
+    def test_matches_json_parser(self):
+        """ Test documents parse like JSONParser """
+        content = '{"title": "Crème", "price": "5.50", "tags": [1]}'
+
+        self.assertEqual(
+            self._parse(FastJSONParser(), content.encode()),
+            self._parse(JSONParser(), content.encode())
+        )
+
+    def test_other_encoding(self):
+        """ Test documents in a non UTF-8 charset are decoded first """
+        content = '{"title": "Crème"}'.encode('latin-1')
+
+        data = self._parse(FastJSONParser(), content, 'latin-1')
+
+        self.assertEqual(data, {'title': 'Crème'})
+
+    def test_invalid_json(self):
+        """ Test invalid and non strict JSON raise ParseError """
+        for content in (b'{"title": ', b'{"price": NaN}'):
+            with self.subTest(content=content):
+                with self.assertRaises(ParseError):
+                    self._parse(FastJSONParser(), content)
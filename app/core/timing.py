@@ -0,0 +1,102 @@
+"""
+Per request timing of SQL, view, serialize and render phases
+
+ServerTimingMiddleware stores a RequestTiming in a context variable for
+the requests it samples. Code outside the middleware adds phases with
+server_timing(), which does nothing for requests that are not sampled.
+"""
+import collections
+import contextlib
+import contextvars
+import time
+
+from rest_framework import serializers
+
+_current = contextvars.ContextVar('server_timing', default=None)
+
+
+class RequestTiming:
+    """Durations by phase and SQL query count of a request"""
+
+    def __init__(self):
+        self.durations = collections.defaultdict(float)
+        self.queries = 0
+        self._started = {}
+
+    def start(self, name):
+        """Start timing a phase, unless it is already running"""
+        self._started.setdefault(name, time.perf_counter())
+
+    def stop(self, name):
+        """Add the time since start(name) to the phase"""
+        started = self._started.pop(name, None)
+        if started is not None:
+            self.durations[name] += time.perf_counter() - started
+
+    def stop_all(self):
+        """Stop every running phase"""
+        for name in list(self._started):
+            self.stop(name)
+
+    def execute(self, execute, sql, params, many, context):
+        """Database execute wrapper counting and timing queries"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.durations['db'] += time.perf_counter() - start
+
+
+def current_timing():
+    """Return the RequestTiming of the request, None if not sampled"""
+    return _current.get()
+
+
+def activate(timing):
+    """Make timing the current RequestTiming, return a reset token"""
+    return _current.set(timing)
+
+
+def deactivate(token):
+    """Restore the RequestTiming current before activate()"""
+    _current.reset(token)
+
+
+@contextlib.contextmanager
+def server_timing(name):
+    """Time the enclosed block as a phase of the current request
+
+    Nested blocks of the same phase are counted once, by the outermost.
+    """
+    timing = _current.get()
+    if timing is None or name in timing._started:
+        yield
+        return
+    timing.start(name)
+    try:
+        yield
+    finally:
+        timing.stop(name)
+
+
+class TimedListSerializer(serializers.ListSerializer):
+    """ListSerializer timing .data as the serialize phase"""
+
+    @property
+    def data(self):
+        with server_timing('serialize'):
+            return super().data
+
+
+class TimedSerializerMixin:
+    """Serializer mixin timing .data as the serialize phase
+
+    Set Meta.list_serializer_class to TimedListSerializer to time
+    many=True serializers as well.
+    """
+
+    @property
+    def data(self):
+        with server_timing('serialize'):
+            return super().data
@@ -0,0 +1,110 @@
+"""
+Memory bounded handling of uploaded files
+
+MaxSizeUploadHandler aborts an upload as soon as a file grows past
+UPLOAD_MAX_BYTES, and TemporaryFileUploadHandler (after it in
+FILE_UPLOAD_HANDLERS) streams accepted chunks to disk. HeaderImageField
+then checks format and dimensions from the image header alone, so
+nothing is decoded before the pixel cap is enforced.
+HeaderImageSerializerField runs the same checks in DRF serializers.
+"""
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from django.utils.translation import gettext_lazy as _
+from PIL import Image
+from rest_framework import serializers
+
+
+class UploadTooLarge(MultiPartParserError):
+    """An uploaded file is larger than UPLOAD_MAX_BYTES"""
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """Reject files larger than UPLOAD_MAX_BYTES while they stream in"""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_BYTES:
+            raise UploadTooLarge(
+                f'{self.file_name} is larger than '
+                f'{settings.UPLOAD_MAX_BYTES} bytes')
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+class HeaderImageField(forms.ImageField):
+    """Image form field validating from the header instead of verify()
+
+    Only the format and size read by Image.open are checked, the pixel
+    data is never loaded. DRF replaces error_messages with its own, so
+    the cap messages are read from default_error_messages.
+    """
+
+    default_error_messages = {
+        **forms.ImageField.default_error_messages,
+        'invalid_format': _('Unsupported image format %(format)s.'),
+        'too_many_pixels': _(
+            'Image is %(pixels)s pixels, at most %(max)s are allowed.'),
+    }
+
+    def to_python(self, data):
+        # Skip forms.ImageField.to_python, it runs verify() on the image
+        f = forms.FileField.to_python(self, data)
+        if f is None:
+            return None
+
+        if hasattr(data, 'temporary_file_path'):
+            source = data.temporary_file_path()
+        else:
+            source = data
+            data.seek(0)
+
+        try:
+            with Image.open(source) as image:
+                image_format, (width, height) = image.format, image.size
+        except (OSError, SyntaxError, Image.DecompressionBombError) as exc:
+            raise ValidationError(
+                self.error_messages['invalid_image'],
+                code='invalid_image'
+            ) from exc
+
+        if image_format not in settings.UPLOAD_IMAGE_FORMATS:
+            raise ValidationError(
+                self.default_error_messages['invalid_format'],
+                code='invalid_format',
+                params={'format': image_format}
+            )
+        if width * height > settings.UPLOAD_MAX_PIXELS:
+            raise ValidationError(
+                self.default_error_messages['too_many_pixels'],
+                code='too_many_pixels',
+                params={
+                    'pixels': width * height,
+                    'max': settings.UPLOAD_MAX_PIXELS
+                }
+            )
+
+        f.content_type = Image.MIME.get(image_format)
+        if hasattr(f, 'seek') and callable(f.seek):
+            f.seek(0)
+        return f
+
+
+class HeaderImageSerializerField(serializers.ImageField):
+    """DRF ImageField validating uploads with HeaderImageField"""
+
+    def to_internal_value(self, data):
+        # Like serializers.ImageField, with the header based form field
+        file_object = serializers.FileField.to_internal_value(self, data)
+        django_field = HeaderImageField()
+        django_field.error_messages = self.error_messages
+        return django_field.clean(file_object)
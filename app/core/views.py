@@ -0,0 +1,74 @@
+"""
+Views of the core app
+"""
+import hmac
+
+from django.conf import settings
+from django.contrib import admin
+from django.http import Http404, HttpResponse
+from django.shortcuts import render
+from django.views.decorators.http import require_GET
+
+from core import profiling
+from core.metrics import render_metrics
+
+
+@require_GET
+def metrics_view(request):
+    """Serve the Prometheus metrics of every worker process
+
+    Scrapers must send METRICS_TOKEN as a bearer token. Without a token
+    configured the metrics are only served with DEBUG on, since /metrics
+    sits outside /api and the proxy exposes it.
+    """
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        received = request.META.get('HTTP_AUTHORIZATION', '')
+        if not hmac.compare_digest(received.encode(), expected.encode()):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        raise Http404('Metrics are disabled')
+
+    content, content_type = render_metrics()
+    return HttpResponse(content, content_type=content_type)
+
+
+def profile_list(request):
+    """Admin page listing the stored request profiles"""
+    profiles = []
+    for profile_id in profiling.profile_ids():
+        details = profiling.load_details(profile_id)
+        if details is not None:
+            profiles.append({'id': profile_id, **details})
+
+    return render(request, 'core/profile_list.html', {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profiles,
+    })
+
+
+def profile_detail(request, profile_id):
+    """Admin page showing the top functions of a profile"""
+    details = profiling.load_details(profile_id)
+    if details is None:
+        raise Http404('No such profile')
+
+    sort = request.GET.get('sort', profiling.SORT_KEYS[0])
+    if sort not in profiling.SORT_KEYS:
+        sort = profiling.SORT_KEYS[0]
+
+    try:
+        report = profiling.top_functions(profile_id, sort)
+    except FileNotFoundError:
+        # Pruned by PROFILE_MAX_COUNT since its details were read
+        raise Http404('No such profile')
+
+    return render(request, 'core/profile_detail.html', {
+        **admin.site.each_context(request),
+        'title': f"{details['method']} {details['path']}",
+        'details': details,
+        'sort': sort,
+        'sort_keys': profiling.SORT_KEYS,
+        'report': report,
+    })
@@ -0,0 +1,213 @@
+"""
+Per user response cache and HTTP validators for recipe api
+"""
+import collections
+import functools
+import hashlib
+import threading
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.metrics import CACHE_REQUESTS
+
+
+VERSION_KEY = 'recipe-api:version:{user_id}'
+MODIFIED_KEY = 'recipe-api:modified:{user_id}'
+RESPONSE_KEY = 'recipe-api:response:{user_id}:{version}:{digest}'
+
+
+def get_user_version(user_id):
+    """Return the cache version of a user's recipe data"""
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a version evicted from the cache is never
+        # handed out again for different data
+        seed = int(time.time() * 1000)
+        cache.add(key, seed, None)
+        version = cache.get(key, seed)
+    return version
+
+
+def get_user_modified(user_id):
+    """Return the timestamp of the last write to a user's recipe data"""
+    key = MODIFIED_KEY.format(user_id=user_id)
+    modified = cache.get(key)
+    if modified is None:
+        # Unknown after an eviction, assume it just changed
+        modified = time.time()
+        cache.add(key, modified, None)
+    return modified
+
+
+def bump_user_version(user_id):
+    """Invalidate every cached response of a user"""
+    cache.set(MODIFIED_KEY.format(user_id=user_id), time.time(), None)
+    try:
+        cache.incr(VERSION_KEY.format(user_id=user_id))
+    except ValueError:
+        get_user_version(user_id)
+
+
+def invalidate_user(user_id):
+    """Bump the user version now and again once the transaction commits
+
+    The second bump drops responses cached by concurrent readers that saw
+    the data before the write was committed.
+    """
+    bump_user_version(user_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+class LRUCache:
+    """Thread safe in-process cache of the max_size last used entries
+
+    For small, hot entries where even a shared cache round trip counts.
+    Entries are never stale if their key holds the user version.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+            except KeyError:
+                return default
+            return self._entries[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+autocomplete_cache = LRUCache(settings.AUTOCOMPLETE_CACHE_SIZE)
+
+
+def _request_digest(request, *parts):
+    """Return a digest of parts and the normalized request path/query"""
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    key = ':'.join([*map(str, parts), f'{request.path}?{query}'])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def response_cache_key(request):
+    """Return the cache key of a request for the current user version"""
+    user_id = request.user.id
+    version = get_user_version(user_id)
+    return RESPONSE_KEY.format(
+        user_id=user_id,
+        version=version,
+        digest=_request_digest(request)
+    )
+
+
+def collection_validators(view, request, **kwargs):
+    """Return ETag and Last-Modified of a per user collection"""
+    user_id = request.user.id
+    version = get_user_version(user_id)
+    return (
+        _request_digest(request, user_id, version),
+        get_user_modified(user_id),
+    )
+
+
+def recipe_validators(view, request, pk=None, **kwargs):
+    """Return ETag and Last-Modified of a recipe from its updated_at"""
+    queryset = view.get_queryset().prefetch_related(None)
+    try:
+        updated_at = queryset.filter(pk=pk).values_list(
+            'updated_at', flat=True).first()
+    except (TypeError, ValueError):
+        return None
+    if updated_at is None:
+        return None
+    return (
+        _request_digest(request, pk, updated_at.isoformat()),
+        updated_at.timestamp(),
+    )
+
+
+def conditional_response(validators_func):
+    """Answer GETs with 304 when the client copy is still current
+
+    validators_func returns an (etag, last_modified timestamp) pair from
+    cheap version metadata, so unchanged data is never rendered.
+
+    The ETag decides when the client sends If-None-Match. Last-Modified
+    has one second granularity, so a write later in the same second
+    would keep it. It is left out, and If-Modified-Since ignored, until
+    the last write is a second old; a later write then always moves it.
+    """
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            validators = validators_func(self, request, **kwargs)
+            if validators is None:
+                return view_method(self, request, *args, **kwargs)
+
+            etag, last_modified = quote_etag(validators[0]), validators[1]
+            if time.time() - last_modified < 1:
+                last_modified = None
+            response = get_conditional_response(
+                request, etag=etag,
+                last_modified=(
+                    None if last_modified is None else int(last_modified))
+            )
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    response['ETag'] = etag
+                    if last_modified is not None:
+                        response['Last-Modified'] = http_date(last_modified)
+
+            # Validators are per user
+            patch_vary_headers(response, ('Authorization',))
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def cached_response(view_method):
+    """Cache successful responses of a viewset action per user
+
+    The cached data is keyed by user, user version, path and normalized
+    query string, so any write bumping the version misses every entry.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = response_cache_key(request)
+        data = cache.get(key)
+        if data is not None:
+            CACHE_REQUESTS.labels('hits').inc()
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        CACHE_REQUESTS.labels('misses').inc()
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RECIPE_API_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
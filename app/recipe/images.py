@@ -0,0 +1,286 @@
+"""
+Storage and background processing of uploaded recipe images
+
+Uploads are saved as-is in the request. Once the transaction commits,
+a bounded thread pool resizes the original into a few widths, re-encodes
+them as WebP and JPEG without EXIF data, and records the results on
+Recipe.image_variants.
+
+With IMAGE_STORAGE_MODE = 'content' originals are stored once per
+SHA-256 of their bytes and reference counted by StoredImage, so an
+identical upload reuses both the file and its variants. Unreferenced
+images are deleted by the sweep_images command.
+"""
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from core.models import Recipe, StoredImage
+from core.storage import ContentAddressedStorage
+from recipe.cache import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+# Pillow format name and file extension of each variant format
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+content_storage = ContentAddressedStorage()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Return the process wide image worker pool, creating it on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_PROCESSING_WORKERS,
+                thread_name_prefix='recipe-image'
+            )
+        return _executor
+
+
+def schedule_image_processing(recipe_id):
+    """Process the image of a recipe once the current transaction commits
+
+    With IMAGE_PROCESSING_WORKERS = 0 the image is processed inline in
+    the on_commit callback instead of in the worker pool.
+    """
+    if settings.IMAGE_PROCESSING_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(_process_in_worker, recipe_id))
+    else:
+        transaction.on_commit(lambda: process_recipe_image(recipe_id))
+
+
+def wait_for_image_processing(timeout=None):
+    """Block until images scheduled so far have been processed
+
+    One task per worker waits on a shared barrier, which every worker
+    only reaches once the tasks queued before it have finished.
+    """
+    workers = settings.IMAGE_PROCESSING_WORKERS
+    if not workers:
+        return
+    barrier = threading.Barrier(workers)
+    futures = [
+        get_executor().submit(barrier.wait, timeout) for _ in range(workers)]
+    for future in futures:
+        future.result()
+
+
+def _process_in_worker(recipe_id):
+    """Process an image from a pool thread and release its connection"""
+    try:
+        process_recipe_image(recipe_id)
+    except Exception:
+        logger.exception('Processing image of recipe %s failed', recipe_id)
+    finally:
+        # Worker threads are not covered by request_finished handlers
+        connections.close_all()
+
+
+def process_recipe_image(recipe_id):
+    """Build the variants of the current image of a recipe
+
+    Every unprocessed recipe still pointing to the image is updated, so a
+    newer upload racing with this one wins. Variants of a stored image are
+    built once and reused, other stale variants are removed.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'user_id', 'image').first()
+    if recipe is None or not recipe.image:
+        return
+
+    name = recipe.image.name
+    current = Recipe.objects.filter(image=name).exclude(
+        image_status=Recipe.IMAGE_READY)
+    current.update(image_status=Recipe.IMAGE_PROCESSING)
+
+    stored = StoredImage.objects.filter(name=name).first()
+    if stored is not None and stored.variants:
+        variants, image_status = stored.variants, Recipe.IMAGE_READY
+    else:
+        try:
+            variants = build_variants(recipe.image)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.warning(
+                'Could not process image of recipe %s', recipe_id,
+                exc_info=True)
+            variants, image_status = {}, Recipe.IMAGE_FAILED
+        else:
+            image_status = Recipe.IMAGE_READY
+        if stored is not None:
+            StoredImage.objects.filter(pk=stored.pk).update(
+                variants=variants)
+
+    user_ids = set(current.values_list('user_id', flat=True))
+    updated = current.update(
+        image_status=image_status,
+        image_variants=variants,
+        updated_at=timezone.now()
+    )
+    if not updated and stored is None:
+        delete_variants(recipe.image.storage, variants)
+        return
+
+    # Queryset updates skip post_save, invalidate cached responses here
+    for user_id in user_ids:
+        invalidate_user(user_id)
+
+
+def store_image(upload):
+    """Store an upload by content hash and take a reference to it
+
+    Returns the StoredImage, with its variants when an identical image
+    was processed before. Must run in the transaction that points a
+    recipe to StoredImage.name.
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    sha256 = digest.hexdigest()
+    _, ext = os.path.splitext(upload.name)
+    name = f'uploads/recipe/sha256/{sha256[:2]}/{sha256}{ext.lower()}'
+
+    with transaction.atomic():
+        # The row lock orders this against a sweep deleting the same file
+        stored, created = StoredImage.objects.select_for_update(
+        ).get_or_create(sha256=sha256, defaults={'name': name})
+        if created:
+            content_storage.save(stored.name, upload)
+        stored.ref_count = F('ref_count') + 1
+        stored.released_at = None
+        stored.save(update_fields=['ref_count', 'released_at'])
+        stored.refresh_from_db(fields=['ref_count'])
+    return stored
+
+
+def release_image(storage, name, variants):
+    """Drop a recipe's reference to an image
+
+    Stored images are left to sweep_images once unreferenced. Other
+    images belong to a single recipe and are deleted after commit.
+    """
+    if not name:
+        return
+
+    released = StoredImage.objects.filter(name=name).update(
+        ref_count=Greatest(F('ref_count') - 1, 0),
+        released_at=timezone.now()
+    )
+    if released:
+        return
+
+    def delete_files():
+        storage.delete(name)
+        delete_variants(storage, variants)
+
+    transaction.on_commit(delete_files)
+
+
+def sweep_image(stored_id):
+    """Delete an unreferenced stored image and its files
+
+    Returns whether it was deleted. Files are deleted while the row is
+    locked, so a concurrent store_image of the same content waits and
+    then writes the file again.
+    """
+    with transaction.atomic():
+        stored = StoredImage.objects.select_for_update(
+            skip_locked=True).filter(pk=stored_id, ref_count=0).first()
+        if stored is None:
+            return False
+        content_storage.delete(stored.name)
+        delete_variants(content_storage, stored.variants)
+        stored.delete()
+    return True
+
+
+def build_variants(image_field):
+    """Save resized, EXIF free copies of an image, return their names
+
+    The result maps format to width to storage name, for example
+    {'webp': {'320': 'uploads/recipe/x_320w.webp'}}. Widths wider than
+    the original are skipped, and formats Pillow cannot write are left
+    out.
+    """
+    storage = image_field.storage
+    base, _ = os.path.splitext(image_field.name)
+
+    with image_field.open('rb') as source, Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.load()
+
+    max_width = max(settings.IMAGE_VARIANT_WIDTHS)
+    widths = {
+        width for width in settings.IMAGE_VARIANT_WIDTHS
+        if width < image.width
+    }
+    widths.add(min(image.width, max_width))
+
+    variants = {}
+    Image.init()
+    try:
+        for width in sorted(widths):
+            resized = _resize(image, width)
+            for key, (pil_format, ext) in VARIANT_FORMATS.items():
+                if pil_format not in Image.SAVE:
+                    continue
+                name = storage.save(
+                    f'{base}_{width}w.{ext}',
+                    ContentFile(_encode(resized, pil_format))
+                )
+                variants.setdefault(key, {})[str(width)] = name
+    except Exception:
+        delete_variants(storage, variants)
+        raise
+    return variants
+
+
+def delete_variants(storage, variants):
+    """Delete the files of previously built variants"""
+    for names in variants.values():
+        for name in names.values():
+            storage.delete(name)
+
+
+def _resize(image, width):
+    """Return image scaled to width, keeping the aspect ratio"""
+    if width >= image.width:
+        return image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _encode(image, pil_format):
+    """Return image encoded as pil_format, without EXIF or other metadata"""
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    buffer = io.BytesIO()
+    image.save(
+        buffer,
+        format=pil_format,
+        quality=settings.IMAGE_VARIANT_QUALITY,
+        optimize=pil_format == 'JPEG'
+    )
+    return buffer.getvalue()
@@ -0,0 +1,147 @@
+"""
+Pagination for recipe api
+"""
+import json
+import operator
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class OptInCursorPagination(CursorPagination):
+    """Keyset pagination enabled only when the client asks for a page
+
+    Clients that send neither `cursor` nor `page_size` keep getting the
+    full, unpaginated list. Pages are fetched with a `WHERE key < position
+    LIMIT n` query on every field of the view ordering, so no OFFSET or
+    COUNT(*) is run however deep the client pages.
+    """
+
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        """Page on the ordering applied by the view, if there is one"""
+        ordering = tuple(queryset.query.order_by)
+        return ordering or super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Paginate only if a cursor or page size was requested"""
+        params = request.query_params
+        if (self.cursor_query_param not in params and
+                self.page_size_query_param not in params):
+            return None
+
+        return self._paginate_keyset(queryset, request, view)
+
+    def _paginate_keyset(self, queryset, request, view):
+        """CursorPagination.paginate_queryset keyed on the whole ordering
+
+        DRF keys the cursor on the first ordering field only and pages
+        through ties with OFFSET, which loops or skips rows when the first
+        field repeats, like a search rank or recipe_count. Positions here
+        hold every ordering field and the view orderings end with a unique
+        field, so each position is unique and offsets stay 0.
+        """
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(
+                self._after_position(current_position, reverse))
+
+        # One extra row tells whether a next page exists
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def _after_position(self, position, reverse):
+        """Return a Q of the rows after position in the paging direction
+
+        (a, b) after (x, y) is a > x OR (a = x AND b > y), with < for
+        descending fields, so it does not need row value comparisons.
+        """
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        conditions = []
+        equal = Q()
+        for order, value in zip(self.ordering, values):
+            field_name = order.lstrip('-')
+            lookup = 'lt' if reverse != order.startswith('-') else 'gt'
+            conditions.append(equal & Q(**{f'{field_name}__{lookup}': value}))
+            equal &= Q(**{field_name: value})
+        return reduce(operator.or_, conditions)
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Return the values of every ordering field of a row as JSON"""
+        values = []
+        for order in ordering:
+            field_name = order.lstrip('-')
+            if isinstance(instance, dict):
+                values.append(instance[field_name])
+            else:
+                values.append(getattr(instance, field_name))
+        return json.dumps(values, default=str)
+
+
+class RecipeCursorPagination(OptInCursorPagination):
+    """Cursor pagination for recipes, newest first"""
+
+    ordering = '-id'
+
+
+class RecipeAttrCursorPagination(OptInCursorPagination):
+    """Cursor pagination for tags and ingredients"""
+
+    ordering = '-name'
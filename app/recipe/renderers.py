@@ -0,0 +1,61 @@
+"""
+Renderers streaming recipe rows for the export action
+"""
+import csv
+
+from rest_framework import renderers
+
+from core.renderers import json_dumps
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """Render one JSON document per line"""
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render a single document, used for error responses"""
+        return b''.join(self.render_stream([data]))
+
+    def render_stream(self, rows):
+        """Yield each row of rows as a line of JSON"""
+        for row in rows:
+            yield json_dumps(row) + b'\n'
+
+
+class _Echo:
+    """File-like object returning what is written, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    """Render flat rows as CSV with a header line
+
+    List values, like the tag names of a recipe, are joined with '|'.
+    """
+
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render a single row, used for error responses"""
+        return ''.join(self.render_stream([data])).encode(self.charset)
+
+    def render_stream(self, rows):
+        """Yield a header line and one line per row of rows"""
+        writer = csv.writer(_Echo())
+        header = None
+        for row in rows:
+            if header is None:
+                header = list(row)
+                yield writer.writerow(header)
+            yield writer.writerow([
+                '|'.join(map(str, value))
+                if isinstance(value, (list, tuple)) else value
+                for value in (row.get(key) for key in header)
+            ])
@@ -1,26 +1,90 @@
+from django.conf import settings
+from django.db import transaction
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 from core.models import Recipe, Tag, Ingredient
+from core.timing import (
+    TimedListSerializer,
+    TimedSerializerMixin,
+    server_timing
+)
+from core.uploads import HeaderImageSerializerField
+from recipe.images import (
+    release_image,
+    schedule_image_processing,
+    store_image
+)
 
 
-class TagSerializer(serializers.ModelSerializer):
+class RecipeAttrSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Base serializer for recipe attributes"""
+
+    def validate_name(self, value):
+        """Reject renaming onto a name the user already has"""
+        request = self.context.get('request')
+        if self.instance is not None and request is not None:
+            exists = self.Meta.model.objects.filter(
+                user=request.user, name=value
+            ).exclude(id=self.instance.id).exists()
+            if exists:
+                raise serializers.ValidationError(
+                    f'{self.Meta.model.__name__} with this name already '
+                    'exists.')
+        return value
+
+
+class TagSerializer(RecipeAttrSerializer):
     """Tag serializer"""
 
     class Meta:
         model = Tag
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(RecipeAttrSerializer):
     """Ingredient serializer"""
 
     class Meta:
-        model = Tag
+        model = Ingredient
         fields = ['id', 'name']
         read_only_fields = ['id']
+        list_serializer_class = TimedListSerializer
+
+
+class SparseFieldsMixin:
+    """Serializer mixin keeping only the fields passed as fields=
+
+    field_columns maps fields reading other model columns than their own
+    name, columns() returns what to pass to only() for a set of fields.
+    """
 
+    field_columns = {}
 
-class RecipeSerializer(serializers.ModelSerializer):
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    @classmethod
+    def columns(cls, fields):
+        """Return the concrete model columns read to serialize fields"""
+        model = cls.Meta.model
+        concrete = {field.name for field in model._meta.concrete_fields}
+        columns = {model._meta.pk.name}
+        for field_name in fields:
+            columns.update(cls.field_columns.get(
+                field_name,
+                [field_name] if field_name in concrete else []
+            ))
+        return sorted(columns)
+
+
+class RecipeSerializer(
+        SparseFieldsMixin, TimedSerializerMixin, serializers.ModelSerializer):
     """Recipe Serializer"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
@@ -38,25 +102,47 @@ class RecipeSerializer(serializers.ModelSerializer):
             "ingredients"
         ]
         read_only_fields = ["id"]
+        list_serializer_class = TimedListSerializer
 
-    def _get_or_create_tags(self, tags, recipe):
-        """ Get or create tags and assign them to recipe"""
+    def _assign_attrs(self, field_name, items, recipe, replace=False):
+        """ Get or create recipe attributes in bulk and assign to recipe
+
+        With replace, links missing from items are removed. Only the
+        difference against the current links is written, so an unchanged
+        list does not touch the through table. Links are written with the
+        manager methods keeping recipe_count of the items up to date.
+        """
         auth_user = self.context['request'].user
+        field = Recipe._meta.get_field(field_name)
+        model = field.related_model
+        through = field.remote_field.through
+        attr_id = f'{model._meta.model_name}_id'
 
-        for tag in tags:
-            newTag, isCreated = Tag.objects.get_or_create(
-                user=auth_user, **tag)
-            recipe.tags.add(newTag)
+        objects = model.objects.get_or_create_many(
+            auth_user, [item['name'] for item in items])
+        wanted = {obj.id for obj in objects.values()}
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        """ Get or create ingredients and assign them to recipe"""
-        auth_user = self.context['request'].user
+        current = set()
+        if replace:
+            links = through.objects.filter(recipe=recipe)
+            current = set(links.values_list(attr_id, flat=True))
+            removed = current - wanted
+            if removed:
+                model.objects.remove_links([recipe.id], removed)
 
-        for tag in ingredients:
-            newTag, isCreated = Ingredient.objects.get_or_create(
-                user=auth_user, **tag)
-            recipe.ingredients.add(newTag)
+        added = wanted - current
+        if added:
+            model.objects.add_links([(recipe.id, obj_id) for obj_id in added])
 
+    def _get_or_create_tags(self, tags, recipe, replace=False):
+        """ Get or create tags and assign them to recipe"""
+        self._assign_attrs('tags', tags, recipe, replace)
+
+    def _get_or_create_ingredients(self, ingredients, recipe, replace=False):
+        """ Get or create ingredients and assign them to recipe"""
+        self._assign_attrs('ingredients', ingredients, recipe, replace)
+
+    @transaction.atomic
     def create(self, validated_data):
         """ Create and return a recipe"""
         tags = validated_data.pop('tags', [])
@@ -68,17 +154,17 @@ class RecipeSerializer(serializers.ModelSerializer):
 
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """ Update and return recipe"""
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            self._get_or_create_ingredients(
+                ingredients, instance, replace=True)
 
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            self._get_or_create_tags(tags, instance, replace=True)
 
         for key, value in validated_data.items():
             setattr(instance, key, value)
@@ -87,22 +173,185 @@ class RecipeSerializer(serializers.ModelSerializer):
         return instance
 
 
+class RecipeRowsSerializer:
+    """Read only equivalent of RecipeSerializer(many=True) for lists
+
+    Recipes come as values() rows and their tags and ingredients are read
+    with one values_list() query each, so no model instances or per row
+    field objects are built. The output is identical to RecipeSerializer
+    given the same rows, with tags and ingredients ordered by id.
+    """
+
+    scalar_fields = [
+        field for field in RecipeSerializer.Meta.fields
+        if field not in ('tags', 'ingredients')
+    ]
+
+    def __init__(self, rows, fields=None):
+        self.rows = rows
+        self.fields = [
+            field for field in RecipeSerializer.Meta.fields
+            if fields is None or field in fields
+        ]
+
+    @classmethod
+    def values(cls, queryset, fields=None):
+        """Return queryset as rows holding the fields and annotations
+
+        The id is always read, it keys tags and ingredients and pages.
+        """
+        scalar_fields = [
+            field for field in cls.scalar_fields
+            if fields is None or field in fields
+        ]
+        return queryset.prefetch_related(None).values(
+            *dict.fromkeys(['id', *scalar_fields]),
+            *queryset.query.annotations
+        )
+
+    @property
+    def data(self):
+        with server_timing('serialize'):
+            return self._data()
+
+    def _data(self):
+        rows = list(self.rows)
+        recipe_ids = [row['id'] for row in rows]
+        related = {
+            field_name: self._related(field_name, recipe_ids)
+            for field_name in ('tags', 'ingredients')
+            if field_name in self.fields
+        }
+        price = RecipeSerializer().fields['price'].to_representation
+
+        data = []
+        for row in rows:
+            item = {}
+            for field_name in self.fields:
+                if field_name in related:
+                    item[field_name] = related[field_name].get(row['id'], [])
+                elif field_name == 'price':
+                    item[field_name] = price(row['price'])
+                else:
+                    item[field_name] = row[field_name]
+            data.append(item)
+        return serializers.ReturnList(data, serializer=self)
+
+    def _related(self, field_name, recipe_ids):
+        """Map recipe ids to their serialized tags or ingredients"""
+        related = {}
+        if not recipe_ids:
+            return related
+
+        field = Recipe._meta.get_field(field_name)
+        attr = field.related_model._meta.model_name
+        links = field.remote_field.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by(f'{attr}_id').values_list(
+            'recipe_id', f'{attr}_id', f'{attr}__name')
+        for recipe_id, attr_id, name in links:
+            related.setdefault(recipe_id, []).append(
+                {'id': attr_id, 'name': name})
+        return related
+
+
+class RecipeExportSerializer(serializers.ModelSerializer):
+    """Flat recipe rows for export, with tag and ingredient names"""
+    tags = serializers.SlugRelatedField(
+        many=True, read_only=True, slug_field='name')
+    ingredients = serializers.SlugRelatedField(
+        many=True, read_only=True, slug_field='name')
+
+    class Meta:
+        model = Recipe
+        fields = RecipeSerializer.Meta.fields
+        read_only_fields = fields
+
+
 class RecipeDetailSerializer(RecipeSerializer):
     """Recipe detail serializer"""
+    image_variants = serializers.SerializerMethodField()
+
+    field_columns = {
+        'image_variants': ['image', 'image_status', 'image_variants'],
+    }
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ["description", "image"]
+        fields = RecipeSerializer.Meta.fields + [
+            "description",
+            "image",
+            "image_status",
+            "image_variants"
+        ]
+        read_only_fields = RecipeSerializer.Meta.read_only_fields + [
+            "image_status"
+        ]
 
+    @extend_schema_field(OpenApiTypes.OBJECT)
+    def get_image_variants(self, recipe):
+        """ Return variant urls by format and width once they are ready"""
+        if recipe.image_status != Recipe.IMAGE_READY:
+            return {}
 
-class RecipeImageSerializer(serializers.ModelSerializer):
+        storage = recipe.image.storage
+        request = self.context.get('request')
+        variants = {}
+        for key, names in recipe.image_variants.items():
+            variants[key] = {}
+            for width, name in names.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                variants[key][width] = url
+        return variants
+
+
+class RecipeImageSerializer(
+        TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for uploaded recipe image"""
 
+    # Declared for the header based validation, with the kwargs
+    # ModelSerializer would derive from Recipe.image
+    image = HeaderImageSerializerField(
+        allow_null=True,
+        max_length=Recipe._meta.get_field('image').max_length
+    )
+
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
-        read_only_fields = ['id']
-        extra_kwargs = {
-            'image': {
-                'required': True
-            }
-        }
+        fields = ['id', 'image', 'image_status']
+        read_only_fields = ['id', 'image_status']
+
+    def update(self, instance, validated_data):
+        """ Save the upload and queue building its variants
+
+        In content storage mode an image stored before is reused, along
+        with its variants when they are built already.
+        """
+        if settings.IMAGE_STORAGE_MODE == 'content':
+            # Take the reference and point the recipe to it together
+            with transaction.atomic():
+                return self._save_image(instance, validated_data, True)
+        return self._save_image(instance, validated_data, False)
+
+    def _save_image(self, instance, validated_data, content_addressed):
+        """ Point instance to the uploaded image, releasing the old one"""
+        storage = instance.image.storage
+        old_name = instance.image.name
+        old_variants = instance.image_variants
+        instance.image_status = Recipe.IMAGE_PENDING
+        instance.image_variants = {}
+
+        if content_addressed:
+            stored = store_image(validated_data.pop('image'))
+            instance.image = stored.name
+            if stored.variants:
+                instance.image_status = Recipe.IMAGE_READY
+                instance.image_variants = stored.variants
+
+        recipe = super().update(instance, validated_data)
+
+        release_image(storage, old_name, old_variants)
+        if recipe.image_status == Recipe.IMAGE_PENDING:
+            schedule_image_processing(recipe.id)
+        return recipe
@@ -0,0 +1,121 @@
+"""
+Signal handlers for recipe api
+"""
+import collections
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import invalidate_user
+from recipe.images import release_image
+
+
+def touch_recipes(**lookup):
+    """Mark recipes matching lookup as modified now"""
+    Recipe.objects.filter(**lookup).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_owner_cache(sender, instance, **kwargs):
+    """Invalidate cached responses of the owner of a changed object"""
+    invalidate_user(instance.user_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_recipe_image(sender, instance, **kwargs):
+    """Drop the reference of a deleted recipe to its image"""
+    release_image(
+        instance.image.storage, instance.image.name, instance.image_variants)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_linked_recipes(sender, instance, created=False, **kwargs):
+    """Touch recipes showing a renamed or deleted tag/ingredient"""
+    if not created:
+        field_name = 'tags' if sender is Tag else 'ingredients'
+        touch_recipes(**{field_name: instance})
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_recipe_links_cache(
+        sender, instance, action, reverse, pk_set, **kwargs):
+    """Touch recipes and invalidate cached responses on link changes"""
+    if action == 'pre_clear' and reverse:
+        # Linked recipes are only known before the links are cleared
+        field_name = 'tags' if isinstance(instance, Tag) else 'ingredients'
+        touch_recipes(**{field_name: instance})
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        touch_recipes(pk=instance.pk)
+    elif pk_set:
+        touch_recipes(pk__in=pk_set)
+
+    invalidate_user(instance.user_id)
+
+
+def _attr_model(through):
+    """Return Tag or Ingredient from a Recipe through model"""
+    return Tag if through is Recipe.tags.through else Ingredient
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def count_recipe_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep recipe_count of tags/ingredients in step with ORM link changes
+
+    Links a remove or clear drops are read before, since pk_set may hold
+    ids that were not linked and is empty on clear.
+    """
+    model = _attr_model(sender)
+    attr_id = f'{model._meta.model_name}_id'
+
+    if action in ('pre_remove', 'pre_clear'):
+        if reverse:
+            links = sender.objects.filter(**{attr_id: instance.pk})
+            if pk_set is not None:
+                links = links.filter(recipe_id__in=pk_set)
+        else:
+            links = sender.objects.filter(recipe_id=instance.pk)
+            if pk_set is not None:
+                links = links.filter(**{f'{attr_id}__in': pk_set})
+        instance._removed_links = collections.Counter(
+            links.values_list(attr_id, flat=True))
+    elif action in ('post_remove', 'post_clear'):
+        removed = getattr(instance, '_removed_links', None)
+        if removed:
+            model.objects.change_counts(
+                {obj_id: -links for obj_id, links in removed.items()})
+        instance._removed_links = None
+    elif action == 'post_add' and pk_set:
+        # Django passes only the ids it inserted to post_add
+        if reverse:
+            model.objects.change_counts({instance.pk: len(pk_set)})
+        else:
+            model.objects.change_counts(dict.fromkeys(pk_set, 1))
+
+
+@receiver(pre_delete, sender=Recipe)
+def uncount_deleted_recipe(sender, instance, **kwargs):
+    """Unlink a recipe being deleted from its tags and ingredients"""
+    Tag.objects.remove_links([instance.pk])
+    Ingredient.objects.remove_links([instance.pk])
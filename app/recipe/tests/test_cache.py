@@ -0,0 +1,164 @@
+"""
+Test per user response cache of recipe api
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe.cache import LRUCache
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+
+
+def recipe_detail_url(recipe_id):
+    """ Return recipe detail url """
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_user(email='cache@example.com'):
+    """ Create and return a user """
+    return get_user_model().objects.create_user(
+        email=email, password='testpass123')
+
+
+def create_recipe(user, title='Sample Recipe'):
+    """ Create and return recipe """
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=10,
+        price=Decimal('5.00')
+    )
+
+
+class ResponseCacheTests(TestCase):
+    """ Test caching of list/detail responses """
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_repeat_read_served_from_cache(self):
+        """ Test a repeated list call is a cache hit with no queries """
+        create_recipe(self.user)
+        first = self.client.get(RECIPE_URL)
+        hits = REGISTRY.get_sample_value(
+            'recipe_api_cache_requests_total', {'result': 'hits'}) or 0
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPE_URL)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(REGISTRY.get_sample_value(
+            'recipe_api_cache_requests_total', {'result': 'hits'}),
+            hits + 1)
+
+    def test_query_string_normalized(self):
+        """ Test parameter order does not change the cache key """
+        self.client.get(RECIPE_URL, {'tags': '1', 'match': 'all'})
+
+        resp = self.client.get(f'{RECIPE_URL}?match=all&tags=1')
+
+        self.assertEqual(resp['X-Cache'], 'HIT')
+
+    def test_cache_per_user(self):
+        """ Test a cached response is not served to another user """
+        create_recipe(self.user)
+        self.client.get(RECIPE_URL)
+
+        other_client = APIClient()
+        other_client.force_authenticate(create_user('other@example.com'))
+        resp = other_client.get(RECIPE_URL)
+
+        self.assertEqual(resp['X-Cache'], 'MISS')
+        self.assertEqual(resp.data, [])
+
+    def test_create_invalidates_cache(self):
+        """ Test creating a recipe invalidates the cached list """
+        self.client.get(RECIPE_URL)
+
+        self.client.post(RECIPE_URL, {
+            'title': 'New', 'time_minutes': 5, 'price': '1.00'})
+        resp = self.client.get(RECIPE_URL)
+
+        self.assertEqual(resp['X-Cache'], 'MISS')
+        self.assertEqual(len(resp.data), 1)
+
+    def test_update_invalidates_cached_detail(self):
+        """ Test updating a recipe invalidates its cached detail """
+        recipe = create_recipe(self.user)
+        url = recipe_detail_url(recipe.id)
+        self.client.get(url)
+
+        self.client.patch(url, {'title': 'Changed'})
+        resp = self.client.get(url)
+
+        self.assertEqual(resp['X-Cache'], 'MISS')
+        self.assertEqual(resp.data['title'], 'Changed')
+
+    def test_delete_invalidates_cache(self):
+        """ Test deleting a recipe invalidates the cached list """
+        recipe = create_recipe(self.user)
+        self.client.get(RECIPE_URL)
+
+        self.client.delete(recipe_detail_url(recipe.id))
+        resp = self.client.get(RECIPE_URL)
+
+        self.assertEqual(resp.data, [])
+
+    def test_tag_change_invalidates_recipe_cache(self):
+        """ Test renaming a tag invalidates cached recipes using it """
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Old')
+        recipe.tags.add(tag)
+        self.client.get(RECIPE_URL)
+        self.client.get(TAG_URL)
+
+        tag.name = 'New'
+        tag.save()
+        recipes = self.client.get(RECIPE_URL)
+        tags = self.client.get(TAG_URL)
+
+        self.assertEqual(recipes.data[0]['tags'][0]['name'], 'New')
+        self.assertEqual(tags.data[0]['name'], 'New')
+
+    def test_error_responses_not_cached(self):
+        """ Test not found responses are not cached """
+        url = recipe_detail_url(0)
+        self.client.get(url)
+
+        resp = self.client.get(url)
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotEqual(resp.get('X-Cache'), 'HIT')
+
+
+class LRUCacheTests(TestCase):
+    """ Test the in-process LRU cache """
+
+    def test_least_recently_used_evicted(self):
+        """ Test the least recently read or written entry is dropped """
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
@@ -0,0 +1,162 @@
+"""
+Test conditional GET support of recipe api
+"""
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+
+
+def recipe_detail_url(recipe_id):
+    """ Return recipe detail url """
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, title='Sample Recipe'):
+    """ Create and return recipe """
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=10,
+        price=Decimal('5.00')
+    )
+
+
+class ConditionalGetTests(TestCase):
+    """ Test ETag and Last-Modified handling """
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='etag@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_not_modified(self):
+        """ Test an unchanged recipe list returns 304 without a body """
+        create_recipe(self.user)
+        resp = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(0):
+            again = self.client.get(
+                RECIPE_URL, HTTP_IF_NONE_MATCH=resp['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(again.content, b'')
+
+    def test_list_modified_after_write(self):
+        """ Test a write changes the recipe list ETag """
+        resp = self.client.get(RECIPE_URL)
+
+        create_recipe(self.user)
+        again = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=resp['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(again['ETag'], resp['ETag'])
+
+    def test_list_etag_depends_on_query(self):
+        """ Test different query strings get different ETags """
+        resp = self.client.get(RECIPE_URL)
+
+        other = self.client.get(RECIPE_URL, {'search': 'soup'})
+
+        self.assertNotEqual(other['ETag'], resp['ETag'])
+
+    def test_list_if_modified_since(self):
+        """ Test If-Modified-Since on an unchanged tag list returns 304 """
+        Tag.objects.create(user=self.user, name='Vegan')
+        with patch('recipe.cache.time.time', return_value=time.time() + 2):
+            resp = self.client.get(TAG_URL)
+
+            again = self.client.get(
+                TAG_URL, HTTP_IF_MODIFIED_SINCE=resp['Last-Modified'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_last_modified_withheld_within_second_of_write(self):
+        """ Test a write in the current second is not hidden by a 304 """
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        resp = self.client.get(TAG_URL)
+        again = self.client.get(
+            TAG_URL, HTTP_IF_MODIFIED_SINCE=http_date(time.time()))
+
+        self.assertNotIn('Last-Modified', resp)
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+
+    def test_etag_preferred_over_last_modified(self):
+        """ Test a stale ETag wins over a current If-Modified-Since """
+        resp = self.client.get(TAG_URL)
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        with patch('recipe.cache.time.time', return_value=time.time() + 2):
+            again = self.client.get(
+                TAG_URL, HTTP_IF_NONE_MATCH=resp['ETag'],
+                HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 2))
+
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+
+    def test_detail_not_modified(self):
+        """ Test an unchanged recipe detail returns 304 """
+        recipe = create_recipe(self.user)
+        url = recipe_detail_url(recipe.id)
+        resp = self.client.get(url)
+
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertIn('Authorization', resp['Vary'])
+
+    def test_detail_etag_ignores_other_recipes(self):
+        """ Test editing another recipe keeps a detail ETag valid """
+        recipe = create_recipe(self.user)
+        other = create_recipe(self.user, title='Other')
+        url = recipe_detail_url(recipe.id)
+        resp = self.client.get(url)
+
+        self.client.patch(recipe_detail_url(other.id), {'title': 'Changed'})
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_modified_by_tag_rename(self):
+        """ Test renaming a linked tag changes the recipe detail ETag """
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Old')
+        recipe.tags.add(tag)
+        url = recipe_detail_url(recipe.id)
+        resp = self.client.get(url)
+
+        self.client.patch(
+            reverse('recipe:tag-detail', args=[tag.id]), {'name': 'New'})
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=resp['ETag'])
+
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertEqual(again.data['tags'][0]['name'], 'New')
+
+    def test_detail_of_other_user_not_found(self):
+        """ Test validators do not leak other users' recipes """
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123')
+        recipe = create_recipe(other_user)
+
+        resp = self.client.get(
+            recipe_detail_url(recipe.id), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
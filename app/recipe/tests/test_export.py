@@ -0,0 +1,123 @@
+"""
+Test streaming export of recipes
+"""
+import csv
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, title='Sample Recipe'):
+    """ Create and return recipe """
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=10,
+        price=Decimal('5.00')
+    )
+
+
+class PublicExportApiTests(TestCase):
+    """ Test unauthenticated export requests """
+
+    def test_auth_required(self):
+        """ Test authentication is required to export """
+        resp = APIClient().get(EXPORT_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateExportApiTests(TestCase):
+    """ Test exporting the recipes of a user """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _content(self, resp):
+        return b''.join(resp.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """ Test recipes stream as one JSON document per line """
+        recipe = create_recipe(self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'))
+
+        resp = self.client.get(EXPORT_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        self.assertTrue(
+            resp['Content-Type'].startswith('application/x-ndjson'))
+        rows = [json.loads(line) for line in self._content(resp).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['title'], recipe.title)
+        self.assertEqual(rows[0]['price'], '5.00')
+        self.assertEqual(rows[0]['tags'], ['Vegan'])
+        self.assertEqual(rows[0]['ingredients'], ['Salt'])
+
+    def test_export_csv(self):
+        """ Test recipes stream as CSV with joined tag names """
+        recipe = create_recipe(self.user, title='Soup, hot')
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name='Vegan'),
+            Tag.objects.create(user=self.user, name='Quick'),
+        )
+
+        resp = self.client.get(EXPORT_URL, {'format': 'csv'})
+
+        self.assertTrue(resp['Content-Type'].startswith('text/csv'))
+        self.assertIn('recipes.csv', resp['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self._content(resp))))
+        self.assertEqual(rows[0]['title'], 'Soup, hot')
+        self.assertEqual(
+            sorted(rows[0]['tags'].split('|')), ['Quick', 'Vegan'])
+        self.assertEqual(rows[0]['ingredients'], '')
+
+    def test_export_limited_to_user_and_filters(self):
+        """ Test export applies the list filters to the user's recipes """
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com', password='testpass123')
+        create_recipe(other_user, title='Not mine')
+        create_recipe(self.user, title='Lentil soup')
+        create_recipe(self.user, title='Apple pie')
+
+        resp = self.client.get(EXPORT_URL, {'search': 'soup'})
+
+        titles = [
+            json.loads(line)['title']
+            for line in self._content(resp).splitlines()
+        ]
+        self.assertEqual(titles, ['Lentil soup'])
+
+    @override_settings(RECIPE_EXPORT_CHUNK_SIZE=2)
+    def test_export_prefetches_per_chunk(self):
+        """ Test relations load with two queries per chunk of recipes """
+        for i in range(5):
+            recipe = create_recipe(self.user, title=f'Recipe {i}')
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+
+        resp = self.client.get(EXPORT_URL)
+        # The cursor query plus tags and ingredients for each of 3 chunks
+        with self.assertNumQueries(7):
+            lines = self._content(resp).splitlines()
+
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['tags'], ['T4'])
@@ -0,0 +1,161 @@
+"""
+Test content addressed storage of recipe images
+"""
+import io
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, StoredImage
+from recipe import images
+
+
+def recipe_image_upload_url(recipe_id):
+    """ Return image upload api endpoint"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def create_recipe(user, title='Sample Recipe'):
+    """ Create and return recipe """
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=10,
+        price=Decimal('5.00')
+    )
+
+
+def image_bytes(color='red'):
+    """ Return a small JPEG image """
+    buffer = io.BytesIO()
+    Image.new('RGB', (20, 10), color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_PROCESSING_WORKERS=0, IMAGE_STORAGE_MODE='content')
+class ContentAddressedImageTests(TestCase):
+    """ Test storing identical uploads once """
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _upload(self, recipe, data, name='photo.jpg'):
+        """ Upload data as the image of recipe """
+        upload = io.BytesIO(data)
+        upload.name = name
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(
+                recipe_image_upload_url(recipe.id),
+                {'image': upload},
+                format='multipart'
+            )
+        recipe.refresh_from_db()
+        return resp
+
+    def _exists(self, name):
+        return os.path.exists(os.path.join(self.media_root, name))
+
+    def test_identical_uploads_share_file_and_variants(self):
+        """ Test an identical upload reuses the stored file and variants """
+        first = create_recipe(self.user)
+        second = create_recipe(self.user, title='Clone')
+        self._upload(first, image_bytes())
+
+        with patch.object(
+                images, 'build_variants',
+                wraps=images.build_variants) as build_variants:
+            resp = self._upload(second, image_bytes(), name='copy.jpg')
+
+        self.assertEqual(resp.data['image_status'], Recipe.IMAGE_READY)
+        build_variants.assert_not_called()
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(first.image_variants, second.image_variants)
+        stored = StoredImage.objects.get()
+        self.assertEqual(stored.ref_count, 2)
+        self.assertEqual(stored.variants, first.image_variants)
+
+    def test_replaced_image_released(self):
+        """ Test replacing an image drops the reference to the old one """
+        recipe = create_recipe(self.user)
+        self._upload(recipe, image_bytes('red'))
+        old = StoredImage.objects.get(name=recipe.image.name)
+
+        self._upload(recipe, image_bytes('blue'))
+
+        old.refresh_from_db()
+        self.assertEqual(old.ref_count, 0)
+        self.assertIsNotNone(old.released_at)
+        self.assertNotEqual(recipe.image.name, old.name)
+
+    def test_sweep_deletes_unreferenced_images(self):
+        """ Test sweep_images deletes files once no recipe uses them """
+        kept = create_recipe(self.user)
+        deleted = create_recipe(self.user, title='Deleted')
+        self._upload(kept, image_bytes('red'))
+        self._upload(deleted, image_bytes('blue'))
+        name, variants = deleted.image.name, deleted.image_variants
+        deleted.delete()
+
+        call_command('sweep_images', min_age_hours=0, stdout=io.StringIO())
+
+        self.assertFalse(self._exists(name))
+        self.assertFalse(self._exists(variants['jpeg']['20']))
+        self.assertTrue(self._exists(kept.image.name))
+        self.assertEqual(StoredImage.objects.get().name, kept.image.name)
+
+    def test_sweep_keeps_recently_released_images(self):
+        """ Test images released within min age survive a sweep """
+        recipe = create_recipe(self.user)
+        self._upload(recipe, image_bytes())
+        name = recipe.image.name
+        recipe.delete()
+
+        call_command('sweep_images', stdout=io.StringIO())
+
+        self.assertTrue(self._exists(name))
+        self.assertEqual(StoredImage.objects.get().ref_count, 0)
+
+    @override_settings(IMAGE_STORAGE_MODE='uuid')
+    def test_uuid_mode_deletes_replaced_image(self):
+        """ Test replacing an image not stored by content deletes it """
+        recipe = create_recipe(self.user)
+        self._upload(recipe, image_bytes('red'))
+        old_name = recipe.image.name
+
+        self._upload(recipe, image_bytes('red'))
+
+        self.assertNotEqual(recipe.image.name, old_name)
+        self.assertFalse(self._exists(old_name))
+        self.assertTrue(self._exists(recipe.image.name))
+        self.assertFalse(StoredImage.objects.exists())
+
+    def test_upload_status_code(self):
+        """ Test a content addressed upload succeeds """
+        recipe = create_recipe(self.user)
+
+        resp = self._upload(recipe, image_bytes())
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(recipe.image.name.startswith('uploads/recipe/sha256/'))
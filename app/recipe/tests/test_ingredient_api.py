@@ -14,6 +14,7 @@ from recipe.serializers import IngredientSerializer
 
 
 INGREDIENT_URL = reverse('recipe:ingredient-list')
+AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 
 
 def get_ingredient_detial_url(ingredient_id):
@@ -165,3 +166,59 @@ class PrivateIngredientApiTests(TestCase):
         resp = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(len(resp.data), 1)
+
+
+class IngredientAutocompleteApiTests(TestCase):
+    """Test autocompleting ingredient names"""
+
+    def setUp(self):
+        self.user = create_user(email='autocomplete@example.com')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def names(self, **params):
+        resp = self.client.get(AUTOCOMPLETE_URL, params)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return [match['name'] for match in resp.data]
+
+    def test_prefix_matches_most_used_first(self):
+        """Test names starting with the term come first, most used first"""
+        recipe = Recipe.objects.create(
+            title='Recipe', time_minutes=5, price=5, user=self.user)
+        for name in ('Garlic', 'Garam masala', 'Ginger', 'Pickled garlic'):
+            create_ingredient(user=self.user, name=name)
+        recipe.ingredients.add(Ingredient.objects.get(name='Garlic'))
+        create_ingredient(
+            user=create_user(email='other@example.com'), name='Garden pea')
+
+        self.assertEqual(
+            self.names(q='ga'), ['Garlic', 'Garam masala'])
+        self.assertEqual(self.names(q='GA', limit=1), ['Garlic'])
+
+    def test_similar_names_fill_remaining_places(self):
+        """Test names matching elsewhere follow the prefix matches"""
+        for name in ('Ginger ale', 'Pickled ginger', 'Salt'):
+            create_ingredient(user=self.user, name=name)
+
+        self.assertEqual(
+            self.names(q='ginger'), ['Ginger ale', 'Pickled ginger'])
+
+    def test_invalid_params_error(self):
+        """Test a missing term or an out of range limit is rejected"""
+        for params in ({}, {'q': ' '}, {'q': 'a', 'limit': 0},
+                       {'q': 'a', 'limit': 'x'}, {'q': 'a', 'limit': 51}):
+            resp = self.client.get(AUTOCOMPLETE_URL, params)
+
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_results_cached_until_change(self):
+        """Test repeated terms skip the database until ingredients change"""
+        create_ingredient(user=self.user, name='Salt')
+        self.client.get(AUTOCOMPLETE_URL, {'q': 'sa'})
+
+        with self.assertNumQueries(0):
+            resp = self.client.get(AUTOCOMPLETE_URL, {'q': 'Sa'})
+        self.assertEqual(resp['X-Cache'], 'HIT')
+
+        create_ingredient(user=self.user, name='Saffron')
+        self.assertEqual(self.names(q='sa'), ['Saffron', 'Salt'])
@@ -0,0 +1,115 @@
+"""
+Test the values() based recipe list serializer
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db.models import Prefetch
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.serializers import RecipeSerializer, RecipeRowsSerializer
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def prefetched(queryset):
+    """ Return queryset prefetching relations like the recipe views """
+    return queryset.prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch('ingredients', queryset=Ingredient.objects.order_by('id'))
+    )
+
+
+class RecipeRowsSerializerTests(TestCase):
+    """ Test RecipeRowsSerializer output matches RecipeSerializer """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='rows@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dessert', 'Quick')
+        ]
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        for i, (title, price) in enumerate([
+                ('Crème brûlée', Decimal('12.50')),
+                ('Soup "hot"', Decimal('0.05')),
+                ('Plain', Decimal('999.99'))]):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=title,
+                description='Line one\nline two' if i else '',
+                time_minutes=i * 10,
+                price=price,
+                link='https://example.com' if i else ''
+            )
+            recipe.tags.add(*reversed(tags[i:]))
+            if i:
+                recipe.ingredients.add(salt)
+
+    def assertSameOutput(self, queryset, fields=None):
+        expected = RecipeSerializer(
+            prefetched(queryset), many=True, fields=fields).data
+        rows = RecipeRowsSerializer(
+            RecipeRowsSerializer.values(queryset, fields), fields)
+
+        self.assertEqual(
+            JSONRenderer().render(rows.data),
+            JSONRenderer().render(expected)
+        )
+
+    def test_output_identical(self):
+        """ Test rendered output is byte identical to RecipeSerializer """
+        self.assertSameOutput(Recipe.objects.order_by('-id'))
+
+    def test_empty_output(self):
+        """ Test an empty list renders like RecipeSerializer """
+        self.assertSameOutput(Recipe.objects.none())
+
+    def test_sparse_output_identical(self):
+        """ Test output of a subset of fields matches RecipeSerializer """
+        for fields in (['title', 'price'], ['tags'], ['id', 'ingredients']):
+            with self.subTest(fields=fields):
+                self.assertSameOutput(Recipe.objects.order_by('-id'), fields)
+
+    def test_sparse_fields_skip_relation_queries(self):
+        """ Test relations not requested are not read """
+        with self.assertNumQueries(2):
+            RecipeRowsSerializer(
+                RecipeRowsSerializer.values(Recipe.objects.all(), ['tags']),
+                ['tags']
+            ).data
+
+    def test_list_uses_two_relation_queries(self):
+        """ Test relations of every row are read with one query each """
+        with self.assertNumQueries(3):
+            RecipeRowsSerializer(
+                RecipeRowsSerializer.values(Recipe.objects.all())).data
+
+    def test_list_response_identical(self):
+        """ Test list responses match RecipeSerializer, paged or searched """
+        queryset = Recipe.objects.filter(user=self.user)
+        for params, expected in [
+                ({}, queryset.order_by('-id')),
+                ({'page_size': 2}, queryset.order_by('-id')[:2]),
+                ({'search': 'soup'}, queryset.filter(title__contains='Soup'))]:
+            with self.subTest(params=params):
+                resp = self.client.get(RECIPE_URL, params)
+
+                data = RecipeSerializer(prefetched(expected), many=True).data
+                if 'page_size' in params:
+                    resp.data = resp.data['results']
+                self.assertEqual(
+                    JSONRenderer().render(resp.data),
+                    JSONRenderer().render(data)
+                )
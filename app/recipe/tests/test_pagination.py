@@ -0,0 +1,154 @@
+"""
+Test cursor pagination on recipe api list endpoints
+"""
+from decimal import Decimal
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+INGREDIENT_URL = reverse('recipe:ingredient-list')
+
+
+def create_recipe(user, title='Sample Recipe'):
+    """ Create and return recipe """
+    return Recipe.objects.create(
+        user=user,
+        title=title,
+        time_minutes=10,
+        price=Decimal('5.00')
+    )
+
+
+class CursorPaginationTests(TestCase):
+    """ Test paginating list endpoints with a cursor """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='pager@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def walk_pages(self, url, page_size, **params):
+        """ Follow next links and return the collected ids """
+        ids = []
+        resp = self.client.get(url, {'page_size': page_size, **params})
+        while True:
+            self.assertEqual(resp.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(resp.data['results']), page_size)
+            ids.extend(item['id'] for item in resp.data['results'])
+            if resp.data['next'] is None:
+                return ids
+            self.assertLessEqual(len(ids), 1000, 'Pages loop')
+            resp = self.client.get(resp.data['next'])
+
+    def test_list_unpaginated_by_default(self):
+        """ Test list returns a plain list without pagination params """
+        create_recipe(self.user)
+
+        resp = self.client.get(RECIPE_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(resp.data, list)
+
+    def test_recipe_pages_follow_id_ordering(self):
+        """ Test recipe pages cover every recipe newest first """
+        recipes = [create_recipe(self.user, f'Recipe {i}') for i in range(7)]
+
+        ids = self.walk_pages(RECIPE_URL, 3)
+
+        self.assertEqual(ids, sorted([r.id for r in recipes], reverse=True))
+
+    def test_tag_pages_follow_name_ordering(self):
+        """ Test tag pages cover every tag in reverse name order """
+        tags = [Tag.objects.create(user=self.user, name=f'Tag {i}')
+                for i in range(5)]
+
+        ids = self.walk_pages(TAG_URL, 2)
+
+        expected = sorted(tags, key=lambda tag: tag.name, reverse=True)
+        self.assertEqual(ids, [tag.id for tag in expected])
+
+    def test_ingredient_pages_follow_name_ordering(self):
+        """ Test ingredient pages cover every ingredient """
+        for i in range(5):
+            Ingredient.objects.create(user=self.user, name=f'Ing {i}')
+
+        ids = self.walk_pages(INGREDIENT_URL, 2)
+
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_tag_pages_follow_recipe_count_ordering(self):
+        """ Test paging tags tied on recipe_count covers every tag once """
+        tags = [
+            Tag.objects.create(
+                user=self.user, name=f'Tag {i:02}', recipe_count=i % 3)
+            for i in range(20)
+        ]
+
+        for ordering, descending in (('recipe_count', False),
+                                     ('-recipe_count', True)):
+            with self.subTest(ordering=ordering):
+                ids = self.walk_pages(TAG_URL, 3, ordering=ordering)
+
+                expected = sorted(
+                    tags, key=lambda tag: (tag.recipe_count, tag.name),
+                    reverse=descending)
+                self.assertEqual(ids, [tag.id for tag in expected])
+
+    def test_search_pages_return_every_match_once(self):
+        """ Test paging search results tied on rank covers every match """
+        recipes = [
+            create_recipe(self.user, 'Curry ' + 'curry ' * (i % 3))
+            for i in range(60)
+        ]
+        create_recipe(self.user, 'Soup')
+
+        ids = self.walk_pages(RECIPE_URL, 3, search='curry')
+
+        self.assertCountEqual(ids, [recipe.id for recipe in recipes])
+
+    def test_previous_pages_follow_composite_ordering(self):
+        """ Test previous links walk back over ties on the first field """
+        for i in range(6):
+            create_recipe(self.user, 'Curry ' + 'curry ' * (i % 2))
+        first = self.client.get(
+            RECIPE_URL, {'search': 'curry', 'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        resp = self.client.get(second.data['previous'])
+
+        self.assertEqual(resp.data['results'], first.data['results'])
+
+    def test_pages_use_keyset_queries(self):
+        """ Test deep pages do not run OFFSET or COUNT queries """
+        for i in range(5):
+            create_recipe(self.user, f'Recipe {i}')
+        first = self.client.get(RECIPE_URL, {'page_size': 2})
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(first.data['next'])
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        for query in ctx.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'].upper())
+            self.assertNotIn('COUNT(', query['sql'].upper())
+
+    def test_invalid_cursor_error(self):
+        """ Test an invalid cursor returns not found """
+        resp = self.client.get(RECIPE_URL, {'cursor': 'invalid'})
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,154 @@
+"""
+Query budget tests for recipe API endpoints
+"""
+import tempfile
+from decimal import Decimal
+from PIL import Image
+
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+# Maximum number of SQL queries allowed per endpoint, whatever the row count
+QUERY_BUDGET = {
+    'recipe-list': 3,
+    # One more than list to read updated_at for the ETag/Last-Modified
+    'recipe-detail': 4,
+    'recipe-upload-image': 2,
+    'recipe-create': 13,
+}
+
+
+def recipe_detail_url(recipe_id):
+    """ Return recipe detail url """
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def recipe_image_upload_url(recipe_id):
+    """ Return image upload api endpoint"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def create_recipes(user, count, tags_per_recipe=3):
+    """ Create and return recipes with tags and ingredients assigned """
+    recipes = []
+    for i in range(count):
+        recipe = Recipe.objects.create(
+            user=user,
+            title=f'Recipe {i}',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+        for j in range(tags_per_recipe):
+            recipe.tags.add(
+                Tag.objects.create(user=user, name=f'Tag {recipe.id}-{j}'))
+            recipe.ingredients.add(Ingredient.objects.create(
+                user=user, name=f'Ing {recipe.id}-{j}'))
+        recipes.append(recipe)
+
+    return recipes
+
+
+class QueryBudgetTests(TestCase):
+    """ Test recipe endpoints run a fixed number of queries """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='budget@example.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def assertQueryBudget(self, endpoint, request):
+        """ Assert request stays within the endpoint query budget """
+        with CaptureQueriesContext(connection) as ctx:
+            resp = request()
+
+        self.assertLessEqual(
+            len(ctx.captured_queries),
+            QUERY_BUDGET[endpoint],
+            '\n'.join(query['sql'] for query in ctx.captured_queries)
+        )
+
+        return resp, len(ctx.captured_queries)
+
+    def test_recipe_list_query_budget(self):
+        """ Test listing recipes does not scale queries with row count """
+        create_recipes(self.user, 1)
+        resp, few = self.assertQueryBudget(
+            'recipe-list', lambda: self.client.get(RECIPE_URL))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        create_recipes(self.user, 20)
+        resp, many = self.assertQueryBudget(
+            'recipe-list', lambda: self.client.get(RECIPE_URL))
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data), 21)
+        self.assertEqual(few, many)
+
+    def test_recipe_detail_query_budget(self):
+        """ Test retrieving a recipe does not scale with nested rows """
+        recipe = create_recipes(self.user, 1, tags_per_recipe=20)[0]
+
+        resp, _ = self.assertQueryBudget(
+            'recipe-detail',
+            lambda: self.client.get(recipe_detail_url(recipe.id)))
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(resp.data['tags']), 20)
+        self.assertEqual(len(resp.data['ingredients']), 20)
+
+    def test_recipe_upload_image_query_budget(self):
+        """ Test uploading an image does not load nested rows """
+        recipe = create_recipes(self.user, 1, tags_per_recipe=5)[0]
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+            image_file.seek(0)
+
+            resp, _ = self.assertQueryBudget(
+                'recipe-upload-image',
+                lambda: self.client.post(
+                    recipe_image_upload_url(recipe.id),
+                    {'image': image_file},
+                    format='multipart'
+                )
+            )
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        recipe.image.delete()
+
+    def test_recipe_create_query_budget(self):
+        """ Test creating a recipe does not scale with nested items """
+        def create(count):
+            payload = {
+                'title': 'Recipe',
+                'time_minutes': 10,
+                'price': Decimal('5.00'),
+                'tags': [{'name': f'Tag {count}-{i}'} for i in range(count)],
+                'ingredients': [
+                    {'name': f'Ing {count}-{i}'} for i in range(count)],
+            }
+            return self.assertQueryBudget(
+                'recipe-create',
+                lambda: self.client.post(RECIPE_URL, payload, format='json'))
+
+        resp, few = create(1)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        resp, many = create(20)
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(resp.data['tags']), 20)
+        self.assertEqual(few, many)
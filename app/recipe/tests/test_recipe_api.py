@@ -5,9 +5,12 @@ import tempfile
 import os
 from PIL import Image
 from decimal import Decimal
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
@@ -15,6 +18,7 @@ from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
 
+from recipe.images import delete_variants
 from recipe.serializers import (
     RecipeSerializer, RecipeDetailSerializer
 )
@@ -259,6 +263,23 @@ class PrivateRecipeApiTests(TestCase):
             ).exists()
             self.assertTrue(tag_exists)
 
+    def test_create_recipe_with_duplicate_tags(self):
+        """ Test duplicate tag names in payload create a single tag"""
+        payload = {}
+        payload.update(RECIPE_PAYLOAD)
+        payload['tags'] = [
+            {'name': 'Vegan'},
+            {'name': 'Vegan'},
+        ]
+
+        resp = self.client.post(RECIPE_URL, payload, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        recipe = Recipe.objects.get(id=resp.data['id'])
+        self.assertEqual(recipe.tags.count(), 1)
+        self.assertEqual(
+            Tag.objects.filter(user=self.user, name='Vegan').count(), 1)
+
     def test_create_tag_on_recipe_update(self):
         """ Test creating a tag on recipe update"""
 
@@ -315,6 +336,52 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.tags.count(), 0)
 
+    def test_update_recipe_tags_keeps_unchanged_links(self):
+        """ Test updating tags only rewrites the changed links"""
+        tag1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag 2')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+        kept_link = Recipe.tags.through.objects.get(recipe=recipe, tag=tag1)
+
+        resp = self.client.patch(
+            recipe_detail_url(recipe.id),
+            {'tags': [{'name': 'Tag 1'}, {'name': 'Tag 3'}]},
+            format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)),
+            {'Tag 1', 'Tag 3'})
+        self.assertTrue(
+            Recipe.tags.through.objects.filter(id=kept_link.id).exists())
+
+    def test_noop_update_skips_link_writes(self):
+        """ Test unchanged tags and ingredients issue no link writes"""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Tag 1'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'))
+        payload = {
+            'tags': [{'name': 'Tag 1'}],
+            'ingredients': [{'name': 'Salt'}],
+        }
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.patch(
+                recipe_detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        through_tables = (
+            Recipe.tags.through._meta.db_table,
+            Recipe.ingredients.through._meta.db_table,
+        )
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if sql.startswith(('INSERT', 'UPDATE', 'DELETE')):
+                for table in through_tables:
+                    self.assertNotIn(f'"{table}"', sql)
+
     def test_create_recipe_with_ingredients_successful(self):
         """ Test creating a new recipe with new ingredients successful """
         payload = {}
@@ -455,6 +522,158 @@ class PrivateRecipeApiTests(TestCase):
         self.assertNotIn(s2.data, resp.data)
         self.assertNotIn(s3.data, resp.data)
 
+    def test_filter_by_all_tags(self):
+        """ Test filtering recipes having all of the given tags"""
+        tag1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag 2')
+
+        recipe1 = create_recipe(user=self.user)
+        recipe1.tags.add(tag1, tag2)
+        recipe2 = create_recipe(user=self.user, title="one tag recipe")
+        recipe2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        resp = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in resp.data], [recipe1.id])
+
+    def test_filter_by_any_tags_without_distinct(self):
+        """ Test filtering by several tags returns each recipe once"""
+        tag1 = Tag.objects.create(user=self.user, name='Tag 1')
+        tag2 = Tag.objects.create(user=self.user, name='Tag 2')
+
+        recipe1 = create_recipe(user=self.user)
+        recipe1.tags.add(tag1, tag2)
+        recipe2 = create_recipe(user=self.user, title="one tag recipe")
+        recipe2.tags.add(tag2)
+        create_recipe(user=self.user, title="no tag recipe")
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in resp.data], [recipe2.id, recipe1.id])
+        for query in ctx.captured_queries:
+            self.assertNotIn('DISTINCT', query['sql'])
+
+    def test_filter_by_invalid_ids_error(self):
+        """ Test filtering with non numeric ids returns bad request"""
+        resp = self.client.get(RECIPE_URL, {'ingredients': '1,abc'})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_invalid_match_error(self):
+        """ Test filtering with an unknown match mode returns bad request"""
+        resp = self.client.get(RECIPE_URL, {'tags': '1', 'match': 'some'})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_ranks_title_matches_first(self):
+        """ Test searching recipes orders results by relevance"""
+        in_description = create_recipe(
+            user=self.user, title='Stew', description='Spicy curry base')
+        in_title = create_recipe(
+            user=self.user, title='Curry', description='Weeknight dinner')
+        create_recipe(user=self.user, title='Salad', description='Fresh')
+
+        resp = self.client.get(RECIPE_URL, {'search': 'curry'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in resp.data], [in_title.id, in_description.id])
+
+    def test_search_combined_with_tags_and_pagination(self):
+        """ Test search composes with tag filters and cursor pages"""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        tagged = []
+        for i in range(3):
+            recipe = create_recipe(
+                user=self.user, title=f'Curry {i}', description='Curry')
+            recipe.tags.add(tag)
+            tagged.append(recipe)
+        create_recipe(user=self.user, title='Curry untagged')
+
+        params = {'search': 'curry', 'tags': f'{tag.id}', 'page_size': 2}
+        first = self.client.get(RECIPE_URL, params)
+        second = self.client.get(first.data['next'])
+
+        ids = [r['id'] for r in first.data['results'] + second.data['results']]
+        self.assertEqual(len(first.data['results']), 2)
+        self.assertEqual(sorted(ids), sorted(r.id for r in tagged))
+
+    def test_list_sparse_fields(self):
+        """ Test fields= limits list output and skips relation queries"""
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(RECIPE_URL, {'fields': 'id,title'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            resp.data, [{'id': recipe.id, 'title': recipe.title}])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('description', ctx.captured_queries[0]['sql'])
+
+    def test_list_omit_fields(self):
+        """ Test omit= drops fields from the list output"""
+        create_recipe(user=self.user)
+
+        resp = self.client.get(
+            RECIPE_URL, {'omit': 'tags,ingredients,description'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(resp.data[0]),
+            ['id', 'title', 'time_minutes', 'price', 'link'])
+
+    def test_list_sparse_fields_paginated(self):
+        """ Test cursor pages work without the id field"""
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+
+        first = self.client.get(
+            RECIPE_URL, {'fields': 'title', 'page_size': 2})
+        second = self.client.get(first.data['next'])
+
+        titles = [
+            r['title'] for r in first.data['results'] + second.data['results']
+        ]
+        self.assertEqual(titles, ['Recipe 2', 'Recipe 1', 'Recipe 0'])
+
+    def test_detail_sparse_fields(self):
+        """ Test fields= limits detail output and the columns read"""
+        recipe = create_recipe(user=self.user)
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(
+                recipe_detail_url(recipe.id),
+                {'fields': 'title,ingredients,image_variants'}
+            )
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, {
+            'title': recipe.title,
+            'ingredients': [{'id': recipe.ingredients.get().id,
+                             'name': 'Salt'}],
+            'image_variants': {},
+        })
+        sql = ' '.join(query['sql'] for query in ctx.captured_queries)
+        self.assertNotIn('"core_recipe"."description"', sql)
+        self.assertNotIn('core_recipe_tags', sql)
+
+    def test_unknown_sparse_field_error(self):
+        """ Test requesting an unknown field returns bad request"""
+        resp = self.client.get(RECIPE_URL, {'fields': 'id,user'})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', resp.data)
+
 
 class ImageUploadApiTests(TestCase):
     """Test image upload"""
@@ -471,8 +690,24 @@ class ImageUploadApiTests(TestCase):
 
     def tearDown(self):
         """ Clean up after each test"""
+        self.recipe.refresh_from_db()
+        delete_variants(self.recipe.image.storage, self.recipe.image_variants)
         self.recipe.image.delete()
 
+    def _upload(self, image, format='JPEG', **save_kwargs):
+        """ Upload image to the recipe, running on_commit callbacks"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image.save(image_file, format=format, **save_kwargs)
+            image_file.seek(0)
+
+            url = recipe_image_upload_url(self.recipe.id)
+            with self.captureOnCommitCallbacks(execute=True):
+                resp = self.client.post(
+                    url, {'image': image_file}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        return resp
+
     def test_image_upload_successful(self):
         """ Test image upload functionality"""
 
@@ -499,3 +734,81 @@ class ImageUploadApiTests(TestCase):
         resp = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IMAGE_PROCESSING_WORKERS=0)
+    def test_upload_builds_variants(self):
+        """ Test variants are built for each width up to the original"""
+        resp = self._upload(Image.new('RGB', (700, 350)))
+
+        self.assertEqual(resp.data['image_status'], Recipe.IMAGE_PENDING)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_READY)
+        widths = self.recipe.image_variants['jpeg']
+        self.assertEqual(set(widths), {'320', '640', '700'})
+        storage = self.recipe.image.storage
+        with storage.open(widths['320']) as variant, \
+                Image.open(variant) as image:
+            self.assertEqual(image.size, (320, 160))
+
+        detail = self.client.get(recipe_detail_url(self.recipe.id))
+        self.assertEqual(detail.data['image_status'], Recipe.IMAGE_READY)
+        self.assertTrue(
+            detail.data['image_variants']['jpeg']['640'].startswith('http'))
+
+    @override_settings(IMAGE_PROCESSING_WORKERS=0)
+    def test_variants_strip_exif(self):
+        """ Test variants are rotated upright and carry no EXIF"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'Camera'  # Make
+        self._upload(Image.new('RGB', (40, 20)), exif=exif.tobytes())
+
+        name = self.recipe.image_variants['jpeg']['20']
+        with self.recipe.image.storage.open(name) as variant, \
+                Image.open(variant) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertNotIn('exif', image.info)
+
+    @override_settings(IMAGE_PROCESSING_WORKERS=0)
+    def test_failed_processing_status(self):
+        """ Test a failure to decode the image is reported as failed"""
+        with patch('recipe.images.build_variants', side_effect=OSError), \
+                self.assertLogs('recipe.images', level='WARNING'):
+            self._upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_FAILED)
+        self.assertEqual(self.recipe.image_variants, {})
+
+    @override_settings(IMAGE_PROCESSING_WORKERS=2)
+    def test_upload_queues_processing_after_commit(self):
+        """ Test the request only queues the image on the worker pool"""
+        with patch('recipe.images.get_executor') as get_executor:
+            resp = self._upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.recipe.image_status, Recipe.IMAGE_PENDING)
+        get_executor.return_value.submit.assert_called_once()
+
+    @override_settings(UPLOAD_MAX_BYTES=1024)
+    def test_upload_over_byte_cap_rejected(self):
+        """ Test a file larger than UPLOAD_MAX_BYTES is rejected"""
+        noise = Image.frombytes('L', (64, 64), os.urandom(64 * 64))
+        resp = self._upload(noise, format='PNG')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(UPLOAD_MAX_PIXELS=50)
+    def test_upload_over_pixel_cap_rejected(self):
+        """ Test an image with too many pixels is rejected"""
+        resp = self._upload(Image.new('RGB', (10, 10)))
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', resp.data)
+        self.assertFalse(self.recipe.image)
+
+    def test_upload_unsupported_format_rejected(self):
+        """ Test an image format outside UPLOAD_IMAGE_FORMATS is rejected"""
+        resp = self._upload(Image.new('RGB', (10, 10)), format='BMP')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', resp.data)
@@ -14,6 +14,7 @@ from recipe.serializers import TagSerializer
 
 
 TAG_URL = reverse('recipe:tag-list')
+AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
 
 
 def get_tag_detial_url(tag_id):
@@ -94,6 +95,19 @@ class PrivateTagApiTests(TestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(str(tag), payload['name'])
 
+    def test_update_tag_existing_name_error(self):
+        """Test renaming a tag onto an existing name fails"""
+
+        create_tag(user=self.user, name='Vegan')
+        tag = create_tag(user=self.user, name='Dinner')
+        resp = self.client.patch(
+            get_tag_detial_url(tag.id), {'name': 'Vegan'})
+
+        tag.refresh_from_db()
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(tag.name, 'Dinner')
+
     def test_delete_tag_successful(self):
         """Test deleting a tag"""
 
@@ -159,6 +173,45 @@ class PrivateTagApiTests(TestCase):
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(len(resp.data), 1)
 
+    def test_assigned_only_zero(self):
+        """Test assigned_only=0 returns unassigned tags too"""
+        create_tag(user=self.user, name='Tag 1')
+
+        resp = self.client.get(TAG_URL, {'assigned_only': 0})
+
+        self.assertEqual(len(resp.data), 1)
+
+    def test_order_tags_by_recipe_count(self):
+        """Test ordering tags by their number of recipes"""
+        recipes = [
+            Recipe.objects.create(
+                title=f'Recipe {i}', time_minutes=5, price=5, user=self.user)
+            for i in range(2)
+        ]
+        popular = create_tag(user=self.user, name='Popular')
+        create_tag(user=self.user, name='Unused')
+        single = create_tag(user=self.user, name='Single')
+        popular.recipe_set.add(*recipes)
+        recipes[0].tags.add(single)
+
+        resp = self.client.get(TAG_URL, {'ordering': '-recipe_count'})
+
+        self.assertEqual(
+            [tag['name'] for tag in resp.data],
+            ['Popular', 'Single', 'Unused'])
+
+        resp = self.client.get(
+            TAG_URL, {'ordering': 'recipe_count', 'assigned_only': 1})
+
+        self.assertEqual(
+            [tag['name'] for tag in resp.data], ['Single', 'Popular'])
+
+    def test_unknown_ordering_error(self):
+        """Test an unknown ordering is rejected"""
+        resp = self.client.get(TAG_URL, {'ordering': 'user'})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
     # def test_get_other_user_tag_successful(self):
         """ Test retriveing other users tag is possible"""
 
@@ -166,3 +219,14 @@ class PrivateTagApiTests(TestCase):
             -tags should only be deleted by admin
             -tags should not be case sensetive
         """
+
+    def test_autocomplete_tags(self):
+        """Test autocompleting tag names of the user"""
+        tag = create_tag(user=self.user, name='Vegan')
+        create_tag(user=self.user, name='Vegetarian')
+        create_tag(user=create_user(email='other@example.com'), name='Veal')
+
+        resp = self.client.get(AUTOCOMPLETE_URL, {'q': 'vega'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, [{'id': tag.id, 'name': 'Vegan'}])
@@ -4,22 +4,48 @@ Recipe api view
 from drf_spectacular.utils import (
     extend_schema,
     extend_schema_view,
+    inline_serializer,
     OpenApiParameter,
     OpenApiTypes
 )
 
-from rest_framework import (viewsets, authentication, permissions, mixins)
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import (
+    Count, Exists, F, FloatField, OuterRef, Prefetch
+)
+from django.db.models.functions import Cast
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+from rest_framework import (viewsets, permissions, mixins, serializers)
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import status
 
+from user.authentication import CachedTokenAuthentication
+from recipe.renderers import CSVRenderer, NDJSONRenderer
 from recipe.serializers import (
     RecipeSerializer,
     RecipeDetailSerializer,
+    RecipeExportSerializer,
+    RecipeRowsSerializer,
     TagSerializer,
     IngredientSerializer,
     RecipeImageSerializer
 )
+from recipe.cache import (
+    autocomplete_cache,
+    cached_response,
+    conditional_response,
+    collection_validators,
+    get_user_version,
+    recipe_validators
+)
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination
+)
 from core.models import (
     Recipe,
     Tag,
@@ -27,20 +53,87 @@ from core.models import (
 )
 
 
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='Comma separated list of tag IDs'
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Comma separated list of ingredient IDs'
+    ),
+    OpenApiParameter(
+        'search',
+        OpenApiTypes.STR,
+        description='Full text search over title and description, '
+                    'results are ordered by relevance'
+    ),
+    OpenApiParameter(
+        'match',
+        OpenApiTypes.STR,
+        enum=['any', 'all'],
+        description='Match recipes having any (default) or all '
+                    'of the given tags/ingredients'
+    )
+]
+
+RECIPE_FIELDS_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to return, '
+                    'by default all of them'
+    ),
+    OpenApiParameter(
+        'omit',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields not to return'
+    )
+]
+
+# Matches returned by tag and ingredient autocomplete
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+AUTOCOMPLETE_PARAMETERS = [
+    OpenApiParameter(
+        'q',
+        OpenApiTypes.STR,
+        required=True,
+        description='Start of the name, matched ignoring case. '
+                    'Similar names fill the remaining places'
+    ),
+    OpenApiParameter(
+        'limit',
+        OpenApiTypes.INT,
+        description=f'Maximum number of matches, '
+                    f'{AUTOCOMPLETE_DEFAULT_LIMIT} by default and '
+                    f'at most {AUTOCOMPLETE_MAX_LIMIT}'
+    )
+]
+
+# ordering= values of tag and ingredient lists, ties broken by name. Names
+# are unique per user, so cursor pages key on (recipe_count, name) and
+# never fall back to OFFSET on tied counts
+RECIPE_ATTR_ORDERINGS = {
+    'name': ['name'],
+    '-name': ['-name'],
+    'recipe_count': ['recipe_count', 'name'],
+    '-recipe_count': ['-recipe_count', '-name'],
+}
+
+
 @extend_schema_view(
     list=extend_schema(
-        parameters=[
-            OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='Comma separated list of tag IDs'
-            ),
-            OpenApiParameter(
-                'ingredients',
-                OpenApiTypes.STR,
-                description='Comma separated list of ingredient IDs'
-            )
-        ]
+        parameters=RECIPE_FILTER_PARAMETERS + RECIPE_FIELDS_PARAMETERS),
+    retrieve=extend_schema(parameters=RECIPE_FIELDS_PARAMETERS),
+    export=extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS,
+        responses=OpenApiTypes.STR,
+        description='Stream every matching recipe as NDJSON (default) or '
+                    'CSV, chosen with the Accept header or ?format='
     )
 )
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -48,26 +141,160 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     serializer_class = RecipeDetailSerializer
     queryset = Recipe.objects.all()
+    pagination_class = RecipeCursorPagination
 
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
+    def _params_to_ints(self, name):
+        """Convert a comma separated query param to a list of ids"""
+        try:
+            return [
+                int(str_id)
+                for str_id in self.request.query_params[name].split(',')
+            ]
+        except ValueError:
+            raise ValidationError(
+                {name: 'Expected a comma separated list of IDs.'})
+
+    def _requested_fields(self):
+        """Return the serializer fields selected with fields= and omit=,
+        None when every field is returned"""
+        if self.action not in ('list', 'retrieve'):
+            return None
+        if not hasattr(self, '_fields'):
+            self._fields = self._parse_fields()
+        return self._fields
+
+    def _parse_fields(self):
+        """Validate the fields= and omit= query params"""
+        params = self.request.query_params
+        if 'fields' not in params and 'omit' not in params:
+            return None
+
+        available = list(self.get_serializer_class()().fields)
+        selected = {}
+        for name in ('fields', 'omit'):
+            if name not in params:
+                continue
+            selected[name] = {
+                field.strip()
+                for field in params[name].split(',') if field.strip()
+            }
+            unknown = selected[name].difference(available)
+            if unknown:
+                raise ValidationError({
+                    name: f'Unknown fields: {", ".join(sorted(unknown))}. '
+                          f'Expected some of {", ".join(available)}.'
+                })
+
+        return [
+            field for field in available
+            if field in selected.get('fields', available) and
+            field not in selected.get('omit', ())
+        ]
+
+    def _filter_by_attr(self, queryset, field_name, ids, match):
+        """Filter recipes linked to ids with a semi-join on the through table
+
+        Semi-joins return each recipe once, so no DISTINCT is needed.
+        """
+        field = Recipe._meta.get_field(field_name)
+        attr_id = f'{field.related_model._meta.model_name}_id'
+        links = field.remote_field.through.objects.filter(
+            **{f'{attr_id}__in': ids})
+
+        if match == 'all':
+            matching = links.values('recipe_id').annotate(
+                matched=Count(attr_id)
+            ).filter(matched=len(set(ids))).values('recipe_id')
+            return queryset.filter(id__in=matching)
+
+        return queryset.filter(Exists(links.filter(recipe_id=OuterRef('pk'))))
+
     def get_queryset(self):
         """Retrive recipes per authenticated user"""
-        tags_params = self.request.query_params.get('tags', None)
-        ingredients_params = self.request.query_params.get('ingredients', None)
+        params = self.request.query_params
+        queryset = self.queryset
+
+        match = params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Expected "any" or "all".'})
+
+        for field_name in ('tags', 'ingredients'):
+            if field_name in params:
+                queryset = self._filter_by_attr(
+                    queryset,
+                    field_name,
+                    self._params_to_ints(field_name),
+                    match
+                )
+
+        # The search vector is only needed by the database
+        queryset = queryset.filter(
+            user=self.request.user).defer('search_vector')
+
+        search = params.get('search', '').strip()
+        if search:
+            query = SearchQuery(
+                search, config='english', search_type='websearch')
+            # ts_rank is a real, read it as a double so the value handed
+            # out in page cursors compares equal to the row again
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+            ).order_by('-rank', '-id')
+        else:
+            queryset = queryset.order_by('-id')
+
+        fields = self._requested_fields()
+        if fields is not None:
+            # Read only the columns of the requested fields
+            queryset = queryset.only(
+                *self.get_serializer_class().columns(fields))
 
-        if tags_params is not None:
-            tags = tags_params.split(',')
-            self.queryset = self.queryset.filter(tags__id__in=tags)
+        if self.action not in ('upload_image', 'export', 'list'):
+            # Load nested tags/ingredients for every row in one query each,
+            # list reads them itself and export prefetches per chunk
+            # since iterator() ignores this
+            queryset = queryset.prefetch_related(*(
+                Prefetch(field_name, queryset=model.objects.order_by('id'))
+                for field_name, model in (
+                    ('tags', Tag), ('ingredients', Ingredient))
+                if fields is None or field_name in fields
+            ))
 
-        if ingredients_params is not None:
-            ingredients = ingredients_params.split(',')
-            self.queryset = self.queryset.filter(
-                ingredients__id__in=ingredients)
+        return queryset
 
-        return self.queryset.filter(
-            user=self.request.user).order_by('-id').distinct()
+    @conditional_response(collection_validators)
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        """List recipes, served from the per user cache when possible
+
+        Rows are read with values() and serialized by RecipeRowsSerializer,
+        which renders the same output as RecipeSerializer for less CPU.
+        """
+        fields = self._requested_fields()
+        queryset = RecipeRowsSerializer.values(
+            self.filter_queryset(self.get_queryset()), fields)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                RecipeRowsSerializer(page, fields).data)
+        return Response(RecipeRowsSerializer(queryset, fields).data)
+
+    @conditional_response(recipe_validators)
+    @cached_response
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a recipe, served from the per user cache when possible"""
+        return super().retrieve(request, *args, **kwargs)
+
+    def get_serializer(self, *args, **kwargs):
+        """Return the serializer, limited to the requested fields"""
+        fields = self._requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
 
     def get_serializer_class(self):
         """Get serializer class"""
@@ -81,6 +308,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Create a new recipe"""
         serializer.save(user=self.request.user)
 
+    @action(
+        methods=['GET'],
+        detail=False,
+        renderer_classes=[NDJSONRenderer, CSVRenderer]
+    )
+    def export(self, request):
+        """Stream the matching recipes of the user as NDJSON or CSV"""
+        queryset = self.get_queryset()
+        renderer = request.accepted_renderer
+
+        response = StreamingHttpResponse(
+            renderer.render_stream(self._export_rows(queryset)),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{renderer.format}"')
+        return response
+
+    def _export_rows(self, queryset):
+        """Yield serialized recipes, reading them through a server side
+        cursor and prefetching tags and ingredients chunk by chunk"""
+        chunk_size = settings.RECIPE_EXPORT_CHUNK_SIZE
+        chunk = []
+        for recipe in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(recipe)
+            if len(chunk) == chunk_size:
+                yield from self._serialize_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield from self._serialize_chunk(chunk)
+
+    def _serialize_chunk(self, recipes):
+        """Return export rows of recipes, loading their relations"""
+        prefetch_related_objects(recipes, 'tags', 'ingredients')
+        return RecipeExportSerializer(recipes, many=True).data
+
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
         recipe = self.get_object()
@@ -92,7 +355,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_200_OK
             )
         return Response(
-                None,
+                serializer.errors,
                 status=status.HTTP_400_BAD_REQUEST
             )
 
@@ -105,8 +368,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.INT,
                 enum=[0, 1],
                 description='Filter by assigned items to recipe'
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=list(RECIPE_ATTR_ORDERINGS),
+                description='Order by name or by number of recipes, '
+                            'descending with a leading -, -name by default'
             )
         ]
+    ),
+    autocomplete=extend_schema(
+        parameters=AUTOCOMPLETE_PARAMETERS,
+        responses=inline_serializer(
+            'RecipeAttrMatch',
+            {
+                'id': serializers.IntegerField(),
+                'name': serializers.CharField()
+            },
+            many=True
+        )
     )
 )
 class BaseRecipeAttrViewSet(
@@ -116,16 +397,74 @@ class BaseRecipeAttrViewSet(
         viewsets.GenericViewSet):
     """Base class for recipe attributes view set"""
 
-    authentication_classes = [authentication.TokenAuthentication]
+    pagination_class = RecipeAttrCursorPagination
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        """Retrive tags/ingredients per authenticated user"""
-        assign_param = self.request.query_params.get('assigned_only', 0)
-        if bool(assign_param):
-            self.queryset = self.queryset.filter(recipe__isnull=False)
-        return self.queryset.filter(
-            user=self.request.user).order_by('-name').distinct()
+        """Retrive tags/ingredients per authenticated user
+
+        assigned_only and ordering by recipes read the denormalized
+        recipe_count, so no join with the recipe links is needed.
+        """
+        queryset = self.queryset.filter(user=self.request.user)
+        params = self.request.query_params
+        if params.get('assigned_only') not in (None, '', '0'):
+            queryset = queryset.filter(recipe_count__gt=0)
+
+        ordering = params.get('ordering') or '-name'
+        if ordering not in RECIPE_ATTR_ORDERINGS:
+            raise ValidationError({
+                'ordering': f'Expected one of '
+                            f'{", ".join(RECIPE_ATTR_ORDERINGS)}.'
+            })
+        return queryset.order_by(*RECIPE_ATTR_ORDERINGS[ordering])
+
+    @conditional_response(collection_validators)
+    @cached_response
+    def list(self, request, *args, **kwargs):
+        """List items, served from the per user cache when possible"""
+        return super().list(request, *args, **kwargs)
+
+    @action(methods=['GET'], detail=False, pagination_class=None)
+    def autocomplete(self, request):
+        """Return the user's items best matching a name prefix
+
+        Results are kept in a per process LRU cache keyed by the user
+        version, so hot prefixes skip the database and any write to the
+        user's data misses them.
+        """
+        term = request.query_params.get('q', '').strip()
+        if not term:
+            raise ValidationError({'q': 'Expected a name prefix.'})
+        try:
+            limit = int(request.query_params.get(
+                'limit', AUTOCOMPLETE_DEFAULT_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= AUTOCOMPLETE_MAX_LIMIT:
+            raise ValidationError({
+                'limit': f'Expected a number from 1 to '
+                         f'{AUTOCOMPLETE_MAX_LIMIT}.'
+            })
+
+        user_id = request.user.id
+        model = self.queryset.model
+        key = (
+            model._meta.label, user_id, get_user_version(user_id),
+            term.upper(), limit
+        )
+        data = autocomplete_cache.get(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        data = [
+            {'id': obj_id, 'name': name}
+            for obj_id, name in model.objects.autocomplete(
+                request.user, term, limit)
+        ]
+        autocomplete_cache.set(key, data)
+        return Response(data, headers={'X-Cache': 'MISS'})
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
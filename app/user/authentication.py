@@ -0,0 +1,77 @@
+"""
+Authentication for user endpoints
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+TOKEN_KEY = 'user:token:{digest}'
+
+
+def token_cache_key(key):
+    """Return the cache key of a token, without exposing the token"""
+    return TOKEN_KEY.format(digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_token(key):
+    """Drop the cached user of a token"""
+    cache.delete(token_cache_key(key))
+
+
+def token_cache_enabled():
+    """Return whether token to user resolutions may be cached
+
+    A process local cache cannot be invalidated from other workers, so
+    it is only used with AUTH_TOKEN_CACHE_LOCAL, for single process runs.
+    """
+    if settings.AUTH_TOKEN_CACHE_TIMEOUT <= 0:
+        return False
+    return (
+        settings.AUTH_TOKEN_CACHE_LOCAL or
+        not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ Token authentication caching the token to user resolution
+
+    Drop-in replacement for TokenAuthentication. Cached entries expire
+    after AUTH_TOKEN_CACHE_TIMEOUT seconds and are dropped when the token
+    is deleted or its user is saved (password or is_active changes).
+
+    Only the user id and is_active are cached, never the password hash.
+    Other fields of request.user are deferred and loaded on first access.
+    """
+
+    def authenticate_credentials(self, key):
+        if not token_cache_enabled():
+            return super().authenticate_credentials(key)
+
+        cache_key = token_cache_key(key)
+        cached = cache.get(cache_key)
+        if cached is not None and cached['key'] == key:
+            if not cached['is_active']:
+                raise exceptions.AuthenticationFailed(
+                    'User inactive or deleted.')
+            user = get_user_model().from_db(
+                DEFAULT_DB_ALIAS,
+                ['id', 'is_active'],
+                [cached['user_id'], cached['is_active']]
+            )
+            return (user, Token(key=key, user=user))
+
+        user, token = super().authenticate_credentials(key)
+        cache.set(
+            cache_key,
+            {'key': key, 'user_id': user.pk, 'is_active': user.is_active},
+            settings.AUTH_TOKEN_CACHE_TIMEOUT
+        )
+        return (user, token)
@@ -6,8 +6,10 @@ from django.utils.translation import ugettext_lazy as _
 from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
 
+from core.timing import TimedSerializerMixin
 
-class UserSerializer(serializers.ModelSerializer):
+
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """ Serializer for user model """
 
     class Meta:
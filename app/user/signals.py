@@ -0,0 +1,38 @@
+"""
+Signal handlers for user endpoints
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from user.authentication import invalidate_token
+
+
+def invalidate_token_on_commit(key):
+    """Drop the cached user of a token now and again after the commit
+
+    The second drop removes an entry a concurrent request cached from
+    the data before the write was committed.
+    """
+    invalidate_token(key)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: invalidate_token(key))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop authenticating with a deleted token"""
+    invalidate_token_on_commit(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """Reload the user of a token after the user changes"""
+    if created:
+        return
+
+    for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True):
+        invalidate_token_on_commit(key)
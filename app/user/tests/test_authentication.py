@@ -0,0 +1,122 @@
+"""
+Test cached token authentication
+"""
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import token_cache_key
+
+GET_ME_URL = reverse('user:me')
+
+
+@override_settings(AUTH_TOKEN_CACHE_LOCAL=True)
+class CachedTokenAuthenticationTests(TestCase):
+    """ Test authenticating with a cached token """
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='token@example.com',
+            password='testpass123',
+            name='Token User'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def cached_entry(self):
+        return cache.get(token_cache_key(self.token.key))
+
+    def test_repeat_request_skips_token_lookup(self):
+        """ Test a second request resolves the token without a query """
+        self.client.get(GET_ME_URL)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(GET_ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+        self.assertEqual(res.data['name'], self.user.name)
+        # Only the profile shown by the view is loaded
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('authtoken', ctx.captured_queries[0]['sql'])
+
+    def test_cache_holds_no_password(self):
+        """ Test only the user id and is_active are cached """
+        self.client.get(GET_ME_URL)
+
+        self.assertEqual(self.cached_entry(), {
+            'key': self.token.key,
+            'user_id': self.user.id,
+            'is_active': True,
+        })
+
+    @override_settings(AUTH_TOKEN_CACHE_LOCAL=False)
+    def test_process_local_cache_not_used(self):
+        """ Test tokens are not cached in a cache other workers miss """
+        res = self.client.get(GET_ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(self.cached_entry())
+
+    def test_user_change_invalidated_after_commit(self):
+        """ Test an entry cached before the commit of a change is dropped """
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.is_active = False
+            self.user.save()
+        # A concurrent request caching the user before the commit
+        cache.set(token_cache_key(self.token.key), {
+            'key': self.token.key, 'user_id': self.user.id,
+            'is_active': True,
+        })
+
+        for callback in callbacks:
+            callback()
+
+        self.assertIsNone(self.cached_entry())
+
+    def test_deleted_token_rejected(self):
+        """ Test a deleted token stops authenticating """
+        self.client.get(GET_ME_URL)
+
+        self.token.delete()
+        res = self.client.get(GET_ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """ Test deactivating a user stops token authentication """
+        self.client.get(GET_ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(GET_ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_reloads_user(self):
+        """ Test changing the password drops the cached user """
+        self.client.get(GET_ME_URL)
+
+        self.user.set_password('newpass123')
+        self.user.save()
+        with self.assertNumQueries(1):
+            res = self.client.get(GET_ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_invalid_token_rejected(self):
+        """ Test an unknown token is rejected """
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(GET_ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
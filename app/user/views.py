@@ -3,7 +3,8 @@ Views for user endpoints
 """
 
 from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
+from user.authentication import CachedTokenAuthentication
 from user.serializers import UserSerializer, AuthSerializer
 from rest_framework.settings import api_settings
 
@@ -23,9 +24,17 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
     """ Handle authenticated users """
 
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication, )
+    authentication_classes = (CachedTokenAuthentication, )
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
-        """ Get loggedin user from request """
-        return self.request.user
+        """ Get loggedin user from request
+
+        Token authenticated users only hold their id, load the profile
+        in one query instead of a query per deferred field.
+        """
+        user = self.request.user
+        deferred = user.get_deferred_fields()
+        if deferred:
+            user.refresh_from_db(fields=deferred)
+        return user
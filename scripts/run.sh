@@ -2,8 +2,15 @@
 
 set -e
 
+# Shared by the uwsgi workers to aggregate /metrics (see core/metrics.py)
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/vol/metrics}"
+
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
 
+# Drop samples of previous runs and of the commands above
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file